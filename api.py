@@ -3,51 +3,141 @@ Fixed API Backend - Correct Column Names & Credentials
 ✅ FIXES: vendor → vendor_id, new credentials, proper SQL queries
 """
 import os
-import jwt
-import json
-from datetime import datetime, timedelta
+import uuid
 from functools import wraps
-from flask import Flask, render_template_string, request, jsonify, redirect
+from flask import Flask, Response, request, jsonify, redirect, g
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-from database import init_db, get_db, insert_or_update_lead, insert_lead_event, get_lead_count, get_event_count
+import auth
+import cache
+import metrics
+import notify
+import pages
+from export import EXPORT_FORMATS, parse_export_args, export_filename, iter_export
+from queries import (
+    orjson, FILTER_OPTIONS_CACHE_TTL, FILTERED_ANALYTICS_CACHE_TTL, AGGREGATES_CACHE_TTL,
+    STREAM_CHUNK_SIZE, STREAM_FORMATS, STATUS_OPTIONS_QUERY, SERVICE_OPTIONS_QUERY,
+    parse_page_args, parse_list_format, parse_stream_format, parse_date_range, event_filters,
+    build_events_query, fetch_events_page, format_events, format_stream_chunk, parse_aggregate_args,
+    aggregates_query, format_aggregates, SEARCH_SIMILARITY_THRESHOLD, SEARCH_THRESHOLD_QUERY,
+    parse_search_args, search_query, format_search_results
+)
+from tasks import trigger_rescrape, get_task_status
+from migrations import check_schema
+from database import get_db, get_pool_stats, get_data_version, fetch_rollups, insert_or_update_lead, insert_lead_event, get_lead_count, get_event_count
+
+class OrjsonProvider(DefaultJSONProvider):
+    """jsonify through orjson - much faster for large event listings"""
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
 
 app = Flask(__name__)
 CORS(app)
 
-# ✅ NEW CREDENTIALS
-ADMIN_USERNAME = os.getenv('ADMIN_USERNAME', 'Gharfix_analyst999')
-ADMIN_PASSWORD = os.getenv('ADMIN_PASSWORD', 'Gharfix314159')
-JWT_SECRET = os.getenv('JWT_SECRET', 'your-secret-key-change-in-production')
-JWT_ALGORITHM = 'HS256'
+if orjson is not None:
+    app.json = OrjsonProvider(app)
+
+# Schema changes run once at release (python migrations.py) - just verify
+check_schema()
+
+# Render and compress the HTML pages once per worker
+pages.preload(app.jinja_env, 'login.html', 'dashboard_advanced.html')
 
-# Initialize database
-init_db()
+@app.before_request
+def start_request_metrics():
+    g.metrics_route = request.url_rule.rule if request.url_rule else 'unmatched'
+    g.metrics_started = metrics.start_request(request.method, g.metrics_route)
+
+@app.teardown_request
+def end_request_metrics(error=None):
+    if 'metrics_started' in g:
+        metrics.end_request(request.method, g.metrics_route)
 
 def token_required(f):
     """Decorator to verify JWT token"""
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        if 'Authorization' in request.headers:
-            auth_header = request.headers['Authorization']
-            try:
-                token = auth_header.split(" ")[1]
-            except:
-                return jsonify({'message': 'Invalid token format'}), 401
+        try:
+            token = auth.get_request_token(request.headers, request.args)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 401
         
         if not token:
             return jsonify({'message': 'Token missing'}), 401
         
         try:
-            data = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-            current_user = data['username']
-        except:
+            current_user = auth.decode_token(token)
+        except Exception:
             return jsonify({'message': 'Invalid token'}), 401
         
         return f(current_user, *args, **kwargs)
     
     return decorated
 
+def data_version_etag(f):
+    """Decorator for conditional GET keyed by the data version.
+    
+    Answers 304 Not Modified from the data_version row alone when the
+    client's If-None-Match is current; otherwise tags the response.
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        version = get_data_version()
+        g.data_version = version  # cache key - see cache.cached()
+        if version is None:
+            return f(*args, **kwargs)
+        
+        # Weak - the same data may be sent gzip/br/identity encoded
+        etag = f'dv-{version}'
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            response = app.make_response(f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.vary.add('Authorization')
+        return response
+    
+    return decorated
+
+def stream_events(filters, params, fmt):
+    """Stream every matching event as NDJSON or a JSON array.
+    
+    Rows come from a server-side (named) cursor STREAM_CHUNK_SIZE at a time,
+    so memory stays flat regardless of table size. The pooled connection is
+    held until the generator finishes or the client disconnects.
+    """
+    query = build_events_query(filters)
+    
+    def generate():
+        with get_db() as conn:
+            with conn.cursor(name=f'events_stream_{uuid.uuid4().hex}') as cur:
+                cur.itersize = STREAM_CHUNK_SIZE
+                cur.execute(query, params)
+                
+                if fmt == 'json':
+                    yield '['
+                
+                first = True
+                while True:
+                    rows = cur.fetchmany(STREAM_CHUNK_SIZE)
+                    if not rows:
+                        break
+                    
+                    yield format_stream_chunk(rows, fmt, first)
+                    first = False
+                
+                if fmt == 'json':
+                    yield ']'
+    
+    return Response(generate(), mimetype=STREAM_FORMATS[fmt])
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     """Login endpoint"""
@@ -57,88 +147,55 @@ def login():
         password = data.get('password')
         
         # ✅ VERIFY AGAINST NEW CREDENTIALS
-        if username == ADMIN_USERNAME and password == ADMIN_PASSWORD:
-            token = jwt.encode(
-                {
-                    'username': username,
-                    'exp': datetime.utcnow() + timedelta(days=30)
-                },
-                JWT_SECRET,
-                algorithm=JWT_ALGORITHM
-            )
-            
-            return jsonify({'token': token}), 200
+        if auth.check_credentials(username, password):
+            return jsonify({'token': auth.issue_token(username)}), 200
         else:
             return jsonify({'message': 'Invalid credentials'}), 401
     
     # Return login HTML
-    return render_template_string(open('login.html').read())
+    return pages.serve_page(app.jinja_env, 'login.html')
 
 @app.route('/dashboard')
 def dashboard():
     """Dashboard page"""
-    return render_template_string(open('dashboard_advanced.html').read())
+    return pages.serve_page(app.jinja_env, 'dashboard_advanced.html')
 
 @app.route('/api/all-analytics', methods=['GET'])
 @token_required
+@data_version_etag
 def all_analytics(current_user):
-    """Get all analytics with corrected SQL query"""
+    """Get all analytics with corrected SQL query (one keyset page per call).
+    
+    Pass ?stream=ndjson or ?stream=json to stream every event instead.
+    """
     try:
-        conn = get_db()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
-        
-        cur = conn.cursor()
-        
-        # ✅ FIXED: Using vendor_id instead of vendor, correct column references
-        cur.execute('''
-            SELECT 
-                le.event_id,
-                l.customer_id,
-                l.first_name,
-                l.last_name,
-                le.service_name,
-                le.status,
-                le.vendor_id,
-                le.rate_card,
-                le.submitted_at
-            FROM lead_events le
-            JOIN leads l ON le.customer_id = l.customer_id
-            ORDER BY le.submitted_at DESC
-        ''')
-        
-        events = cur.fetchall()
-        
-        # Get counts
-        cur.execute('SELECT COUNT(*) FROM leads')
-        unique_customers = cur.fetchone()[0]
-        
-        cur.execute('SELECT COUNT(*) FROM lead_events')
-        total_events = cur.fetchone()[0]
-        
-        # Format results
-        leads_list = []
-        for row in events:
-            leads_list.append({
-                'event_id': row[0],
-                'customer_id': row[1],
-                'first_name': row[2],
-                'last_name': row[3],
-                'service': row[4],
-                'status': row[5],
-                'vendor_id': row[6],
-                'rate_card': row[7],
-                'date': row[8].strftime('%Y-%m-%d') if row[8] else None,
-                'time': row[8].strftime('%H:%M:%S') if row[8] else None
-            })
+        try:
+            stream_format = parse_stream_format(request.args)
+            if stream_format:
+                return stream_events([], [], stream_format)
+            
+            limit, after = parse_page_args(request.args)
+            fmt = parse_list_format(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        cur.close()
-        conn.close()
+        with get_db() as conn:
+            cur = conn.cursor()
+            
+            # ✅ FIXED: Using vendor_id instead of vendor, correct column references
+            events, next_cursor = fetch_events_page(cur, [], [], limit, after)
+            
+            # Get counts from the rollup tables
+            rollups = fetch_rollups(cur)
+            
+            cur.close()
         
         return jsonify({
-            'unique_customers': unique_customers,
-            'total_events': total_events,
-            'leads': leads_list
+            'unique_customers': rollups['unique_customers'],
+            'total_events': rollups['total_events'],
+            'leads': format_events(events, fmt),
+            'limit': limit,
+            'next_cursor': next_cursor
         }), 200
     
     except Exception as e:
@@ -147,70 +204,52 @@ def all_analytics(current_user):
 
 @app.route('/api/filtered-analytics', methods=['GET'])
 @token_required
+@data_version_etag
 def filtered_analytics(current_user):
-    """Get filtered analytics"""
+    """Get filtered analytics (one keyset page per call, or ?stream=ndjson|json).
+    
+    ?start= / ?end= (ISO dates, end exclusive) bound submitted_at, so only
+    the matching monthly partitions are scanned.
+    """
     try:
         status_filter = request.args.get('status')
         service_filter = request.args.get('service')
         
-        conn = get_db()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
-        
-        cur = conn.cursor()
-        
-        # Build query with filters
-        query = '''
-            SELECT 
-                le.event_id,
-                l.customer_id,
-                l.first_name,
-                l.last_name,
-                le.service_name,
-                le.status,
-                le.vendor_id,
-                le.rate_card,
-                le.submitted_at
-            FROM lead_events le
-            JOIN leads l ON le.customer_id = l.customer_id
-            WHERE 1=1
-        '''
-        
-        params = []
-        
-        if status_filter and status_filter != 'all':
-            query += ' AND le.status = %s'
-            params.append(status_filter)
-        
-        if service_filter and service_filter != 'all':
-            query += ' AND le.service_name = %s'
-            params.append(service_filter)
-        
-        query += ' ORDER BY le.submitted_at DESC'
-        
-        cur.execute(query, params)
-        events = cur.fetchall()
-        
-        # Format results
-        leads_list = []
-        for row in events:
-            leads_list.append({
-                'event_id': row[0],
-                'customer_id': row[1],
-                'first_name': row[2],
-                'last_name': row[3],
-                'service': row[4],
-                'status': row[5],
-                'vendor_id': row[6],
-                'rate_card': row[7],
-                'date': row[8].strftime('%Y-%m-%d') if row[8] else None,
-                'time': row[8].strftime('%H:%M:%S') if row[8] else None
-            })
+        try:
+            # Build filters
+            start, end = parse_date_range(request.args)
+            filters, params = event_filters(status_filter, service_filter, start, end)
+            
+            stream_format = parse_stream_format(request.args)
+            if stream_format:
+                return stream_events(filters, params, stream_format)
+            
+            limit, after = parse_page_args(request.args)
+            fmt = parse_list_format(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        cur.close()
-        conn.close()
+        def compute():
+            with get_db() as conn:
+                cur = conn.cursor()
+                events, next_cursor = fetch_events_page(cur, filters, params, limit, after)
+                cur.close()
+            
+            return {
+                'leads': format_events(events, fmt),
+                'limit': limit,
+                'next_cursor': next_cursor
+            }
         
-        return jsonify({'leads': leads_list}), 200
+        result = cache.cached(
+            'filtered_analytics',
+            g.data_version,
+            [status_filter, service_filter, request.args.get('start'), request.args.get('end'),
+             limit, request.args.get('cursor'), fmt],
+            compute,
+            ttl=FILTERED_ANALYTICS_CACHE_TTL
+        )
+        return jsonify(result), 200
     
     except Exception as e:
         print(f"Error in filtered_analytics: {e}")
@@ -218,45 +257,162 @@ def filtered_analytics(current_user):
 
 @app.route('/api/filter-options', methods=['GET'])
 @token_required
+@data_version_etag
 def filter_options(current_user):
     """Get available filter options"""
     try:
-        conn = get_db()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
+        def compute():
+            with get_db() as conn:
+                cur = conn.cursor()
+                
+                # Get unique statuses
+                cur.execute(STATUS_OPTIONS_QUERY)
+                statuses = [row[0] for row in cur.fetchall()]
+                
+                # Get unique services
+                cur.execute(SERVICE_OPTIONS_QUERY)
+                services = [row[0] for row in cur.fetchall()]
+                
+                cur.close()
+            
+            return {
+                'statuses': statuses,
+                'services': services
+            }
         
-        cur = conn.cursor()
+        result = cache.cached('filter_options', g.data_version, [], compute, ttl=FILTER_OPTIONS_CACHE_TTL)
+        return jsonify(result), 200
+    
+    except Exception as e:
+        print(f"Error getting filter options: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/aggregates', methods=['GET'])
+@token_required
+@data_version_etag
+def aggregates(current_user):
+    """Grouped event counts computed in SQL.
+    
+    ?bucket=hour|day|week buckets by submitted_at, ?group_by= takes a
+    comma-separated list of status, service_name, vendor_id, rate_card, and
+    ?start= / ?end= (ISO dates, end exclusive) bound the range.
+    """
+    try:
+        try:
+            bucket, group_by, start, end = parse_aggregate_args(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Get unique statuses
-        cur.execute('SELECT DISTINCT status FROM lead_events WHERE status IS NOT NULL ORDER BY status')
-        statuses = [row[0] for row in cur.fetchall()]
+        def compute():
+            query, params = aggregates_query(bucket, group_by, start, end)
+            with get_db() as conn:
+                rows = conn.execute(query, params).fetchall()
+            return format_aggregates(rows, bucket, group_by)
         
-        # Get unique services
-        cur.execute('SELECT DISTINCT service_name FROM lead_events WHERE service_name IS NOT NULL ORDER BY service_name')
-        services = [row[0] for row in cur.fetchall()]
+        result = cache.cached(
+            'aggregates',
+            g.data_version,
+            [bucket, group_by, request.args.get('start'), request.args.get('end')],
+            compute,
+            ttl=AGGREGATES_CACHE_TTL
+        )
+        return jsonify(result), 200
+    
+    except Exception as e:
+        print(f"Error in aggregates: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/search', methods=['GET'])
+@token_required
+@data_version_etag
+def search(current_user):
+    """Typo-tolerant lead search with each match's latest events.
+    
+    ?q= matches names, email and phone digits (prefix, substring or a close
+    misspelling), best matches first; ?limit= caps the results.
+    """
+    try:
+        try:
+            q, limit = parse_search_args(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        cur.close()
-        conn.close()
+        query, params = search_query(q, limit)
+        with get_db() as conn:
+            conn.execute(SEARCH_THRESHOLD_QUERY, (str(SEARCH_SIMILARITY_THRESHOLD),))
+            rows = conn.execute(query, params).fetchall()
         
-        return jsonify({
-            'statuses': statuses,
-            'services': services
-        }), 200
+        return jsonify({'query': q, 'results': format_search_results(rows)}), 200
+    
+    except Exception as e:
+        print(f"Error in search: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/export', methods=['GET'])
+@token_required
+def export_events(current_user):
+    """Download every matching event as CSV, or Parquet with ?format=parquet.
+    
+    Takes filtered_analytics' status/service/start/end filters. CSV blocks
+    go from COPY TO STDOUT straight to the client, so memory stays flat.
+    """
+    try:
+        fmt, filters, params = parse_export_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def generate():
+        with get_db() as conn:
+            yield from iter_export(conn, fmt, filters, params)
+    
+    response = Response(generate(), mimetype=EXPORT_FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="{export_filename(fmt)}"'
+    return response
+
+@app.route('/api/pool-stats', methods=['GET'])
+@token_required
+def pool_stats(current_user):
+    """Get database connection pool statistics for this worker"""
+    try:
+        return jsonify(get_pool_stats()), 200
     
     except Exception as e:
-        print(f"Error getting filter options: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/cache-stats', methods=['GET'])
+@token_required
+def cache_stats(current_user):
+    """Get result cache hit/miss counters"""
+    try:
+        return jsonify(cache.get_stats()), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/events', methods=['GET'])
+@token_required
+def events(current_user):
+    """Server-Sent Events: data_changed and rescrape_progress pushes"""
+    response = Response(notify.sse_stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @app.route('/api/rescrape', methods=['POST'])
 @token_required
 def rescrape(current_user):
-    """Trigger rescrape task"""
+    """Trigger rescrape task on the Celery workers, or return the one already in flight"""
     try:
-        # For now, return success (implement Celery integration if needed)
+        data = request.get_json(silent=True) or {}
+        full_resync = bool(data.get('full_resync'))
+        
+        task_id, queued = trigger_rescrape(full_resync=full_resync)
+        
         return jsonify({
-            'message': 'Rescrape task queued',
-            'task_id': 'task-123'
-        }), 200
+            'message': 'Rescrape task queued' if queued else 'Rescrape already in progress',
+            'task_id': task_id,
+            'coalesced': not queued
+        }), 202
     
     except Exception as e:
         print(f"Error in rescrape: {e}")
@@ -265,18 +421,50 @@ def rescrape(current_user):
 @app.route('/api/rescrape-status/<task_id>', methods=['GET'])
 @token_required
 def rescrape_status(current_user, task_id):
-    """Get rescrape task status"""
+    """Get rescrape task status from the Celery result backend"""
     try:
-        # Return mock status
-        return jsonify({
-            'task_id': task_id,
-            'status': 'completed',
-            'progress': 100
-        }), 200
+        return jsonify(get_task_status(task_id)), 200
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Prometheus metrics for every worker (METRICS_TOKEN bearer auth if set)"""
+    if not metrics.authorized(request.headers.get('Authorization')):
+        return jsonify({'message': 'Invalid token'}), 401
+    
+    metrics.observe_pool(get_pool_stats())
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
+@app.after_request
+def record_request_metrics(response):
+    """Record route latency and refresh this worker's pool gauges"""
+    if 'metrics_started' in g:
+        metrics.finish_request(request.method, g.metrics_route, response.status_code, g.metrics_started)
+        metrics.observe_pool(get_pool_stats())
+    return response
+
+@app.after_request
+def compress_response(response):
+    """Compress JSON responses with the best encoding the client accepts"""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or response.mimetype != 'application/json' or 'Content-Encoding' in response.headers):
+        return response
+    
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < pages.COMPRESS_MIN_BYTES:
+        return response
+    
+    data, encoding = pages.compress_body(data, request.accept_encodings)
+    if encoding:
+        response.set_data(data)
+        response.headers['Content-Encoding'] = encoding
+    
+    return response
+
 @app.errorhandler(404)
 def not_found(error):
     return jsonify({'error': 'Not found'}), 404
@@ -0,0 +1,491 @@
+"""
+Async API Backend - Same Routes on asyncio + psycopg AsyncConnection
+✅ NEW: One process serves hundreds of concurrent requests and long-lived
+streams; a slow analytics query suspends its own request, not a worker.
+
+Run with hypercorn instead of gunicorn (create the metrics directory first
+when running several workers, so /metrics aggregates them):
+    PROMETHEUS_MULTIPROC_DIR=/tmp/gharfix-metrics hypercorn api_async:app --workers ${WEB_CONCURRENCY:-2} --bind 0.0.0.0:$PORT
+"""
+import os
+import uuid
+import asyncio
+import jinja2
+from functools import wraps
+from quart import Quart, Response, request, jsonify, make_response, g
+from quart.json.provider import DefaultJSONProvider
+from quart.wrappers.response import DataBody
+from quart_cors import cors
+import auth
+import cache
+import metrics
+import notify
+import pages
+from export import EXPORT_FORMATS, parse_export_args, export_filename, iter_export_async
+from queries import (
+    orjson, FILTER_OPTIONS_CACHE_TTL, FILTERED_ANALYTICS_CACHE_TTL, AGGREGATES_CACHE_TTL,
+    STREAM_CHUNK_SIZE, STREAM_FORMATS, STATUS_OPTIONS_QUERY, SERVICE_OPTIONS_QUERY,
+    parse_page_args, parse_list_format, parse_stream_format, parse_date_range, event_filters,
+    build_events_query, events_page_query, finish_page, format_events, format_stream_chunk,
+    parse_aggregate_args, aggregates_query, format_aggregates, SEARCH_SIMILARITY_THRESHOLD,
+    SEARCH_THRESHOLD_QUERY, parse_search_args, search_query, format_search_results
+)
+from tasks import trigger_rescrape, get_task_status
+from migrations import check_schema
+from database import (
+    close_pool, open_async_pool, close_async_pool, get_async_db,
+    get_async_pool_stats, get_data_version_async, fetch_rollups_async
+)
+
+class OrjsonProvider(DefaultJSONProvider):
+    """jsonify through orjson - much faster for large event listings"""
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+app = Quart(__name__)
+app = cors(app)
+
+if orjson is not None:
+    app.json = OrjsonProvider(app)
+
+# Schema changes run once at release (python migrations.py) - just verify,
+# then drop the sync pool; requests use the async pool
+check_schema()
+close_pool()
+
+# Quart's own jinja environment is async-only; the pages are static HTML
+PAGE_ENV = jinja2.Environment()
+pages.preload(PAGE_ENV, 'login.html', 'dashboard_advanced.html')
+
+@app.before_serving
+async def open_db_pool():
+    await open_async_pool()
+
+@app.after_serving
+async def close_db_pool():
+    await close_async_pool()
+
+@app.before_request
+async def start_request_metrics():
+    g.metrics_route = request.url_rule.rule if request.url_rule else 'unmatched'
+    g.metrics_started = metrics.start_request(request.method, g.metrics_route)
+
+@app.teardown_request
+async def end_request_metrics(error=None):
+    if 'metrics_started' in g:
+        metrics.end_request(request.method, g.metrics_route)
+
+def token_required(f):
+    """Decorator to verify JWT token"""
+    @wraps(f)
+    async def decorated(*args, **kwargs):
+        try:
+            token = auth.get_request_token(request.headers, request.args)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 401
+        
+        if not token:
+            return jsonify({'message': 'Token missing'}), 401
+        
+        try:
+            current_user = auth.decode_token(token)
+        except Exception:
+            return jsonify({'message': 'Invalid token'}), 401
+        
+        return await f(current_user, *args, **kwargs)
+    
+    return decorated
+
+def data_version_etag(f):
+    """Decorator for conditional GET keyed by the data version.
+    
+    Answers 304 Not Modified from the data_version row alone when the
+    client's If-None-Match is current; otherwise tags the response.
+    """
+    @wraps(f)
+    async def decorated(*args, **kwargs):
+        version = await get_data_version_async()
+        g.data_version = version  # cache key - see cache.cached()
+        if version is None:
+            return await f(*args, **kwargs)
+        
+        # Weak - the same data may be sent gzip/br/identity encoded
+        etag = f'dv-{version}'
+        if request.if_none_match.contains_weak(etag):
+            response = Response('', status=304)
+        else:
+            response = await make_response(await f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.vary.add('Authorization')
+        return response
+    
+    return decorated
+
+async def encode_chunks(chunks):
+    """Encode a text stream for the ASGI server"""
+    async for chunk in chunks:
+        yield chunk.encode('utf-8')
+
+def streaming_response(chunks, mimetype):
+    """Wrap an async text stream in a response exempt from RESPONSE_TIMEOUT"""
+    response = Response(encode_chunks(chunks), mimetype=mimetype)
+    response.timeout = None
+    return response
+
+def stream_events(filters, params, fmt):
+    """Stream every matching event as NDJSON or a JSON array.
+    
+    Rows come from a server-side (named) async cursor STREAM_CHUNK_SIZE at a
+    time, so memory stays flat and the event loop keeps serving other
+    requests between chunks.
+    """
+    query = build_events_query(filters)
+    
+    async def generate():
+        async with get_async_db() as conn:
+            async with conn.cursor(name=f'events_stream_{uuid.uuid4().hex}') as cur:
+                cur.itersize = STREAM_CHUNK_SIZE
+                await cur.execute(query, params)
+                
+                if fmt == 'json':
+                    yield '['
+                
+                first = True
+                while True:
+                    rows = await cur.fetchmany(STREAM_CHUNK_SIZE)
+                    if not rows:
+                        break
+                    
+                    yield format_stream_chunk(rows, fmt, first)
+                    first = False
+                
+                if fmt == 'json':
+                    yield ']'
+    
+    return streaming_response(generate(), STREAM_FORMATS[fmt])
+
+async def fetch_events_page(cur, filters, params, limit, after=None):
+    """Fetch one keyset page of events on an AsyncCursor; returns (rows, next_cursor)"""
+    query, params = events_page_query(filters, params, limit, after)
+    await cur.execute(query, params)
+    return finish_page(await cur.fetchall(), limit)
+
+@app.route('/login', methods=['GET', 'POST'])
+async def login():
+    """Login endpoint"""
+    if request.method == 'POST':
+        data = await request.get_json()
+        username = data.get('username')
+        password = data.get('password')
+        
+        if auth.check_credentials(username, password):
+            return jsonify({'token': auth.issue_token(username)}), 200
+        else:
+            return jsonify({'message': 'Invalid credentials'}), 401
+    
+    # Return login HTML
+    return pages.serve_page(PAGE_ENV, 'login.html', request, Response)
+
+@app.route('/dashboard')
+async def dashboard():
+    """Dashboard page"""
+    return pages.serve_page(PAGE_ENV, 'dashboard_advanced.html', request, Response)
+
+@app.route('/api/all-analytics', methods=['GET'])
+@token_required
+@data_version_etag
+async def all_analytics(current_user):
+    """Get all analytics (one keyset page per call, or ?stream=ndjson|json)"""
+    try:
+        try:
+            stream_format = parse_stream_format(request.args)
+            if stream_format:
+                return stream_events([], [], stream_format)
+            
+            limit, after = parse_page_args(request.args)
+            fmt = parse_list_format(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        async with get_async_db() as conn:
+            async with conn.cursor() as cur:
+                events, next_cursor = await fetch_events_page(cur, [], [], limit, after)
+                
+                # Get counts from the rollup tables
+                rollups = await fetch_rollups_async(cur)
+        
+        return jsonify({
+            'unique_customers': rollups['unique_customers'],
+            'total_events': rollups['total_events'],
+            'leads': format_events(events, fmt),
+            'limit': limit,
+            'next_cursor': next_cursor
+        }), 200
+    
+    except Exception as e:
+        print(f"Error in all_analytics: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/filtered-analytics', methods=['GET'])
+@token_required
+@data_version_etag
+async def filtered_analytics(current_user):
+    """Get filtered analytics (one keyset page per call, or ?stream=ndjson|json).
+    
+    ?start= / ?end= (ISO dates, end exclusive) bound submitted_at, so only
+    the matching monthly partitions are scanned.
+    """
+    try:
+        status_filter = request.args.get('status')
+        service_filter = request.args.get('service')
+        
+        try:
+            # Build filters
+            start, end = parse_date_range(request.args)
+            filters, params = event_filters(status_filter, service_filter, start, end)
+            
+            stream_format = parse_stream_format(request.args)
+            if stream_format:
+                return stream_events(filters, params, stream_format)
+            
+            limit, after = parse_page_args(request.args)
+            fmt = parse_list_format(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        async def compute():
+            async with get_async_db() as conn:
+                async with conn.cursor() as cur:
+                    events, next_cursor = await fetch_events_page(cur, filters, params, limit, after)
+            
+            return {
+                'leads': format_events(events, fmt),
+                'limit': limit,
+                'next_cursor': next_cursor
+            }
+        
+        result = await cache.cached_async(
+            'filtered_analytics',
+            g.data_version,
+            [status_filter, service_filter, request.args.get('start'), request.args.get('end'),
+             limit, request.args.get('cursor'), fmt],
+            compute,
+            ttl=FILTERED_ANALYTICS_CACHE_TTL
+        )
+        return jsonify(result), 200
+    
+    except Exception as e:
+        print(f"Error in filtered_analytics: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/filter-options', methods=['GET'])
+@token_required
+@data_version_etag
+async def filter_options(current_user):
+    """Get available filter options"""
+    try:
+        async def compute():
+            async with get_async_db() as conn:
+                cur = await conn.execute(STATUS_OPTIONS_QUERY)
+                statuses = [row[0] for row in await cur.fetchall()]
+                
+                cur = await conn.execute(SERVICE_OPTIONS_QUERY)
+                services = [row[0] for row in await cur.fetchall()]
+            
+            return {
+                'statuses': statuses,
+                'services': services
+            }
+        
+        result = await cache.cached_async('filter_options', g.data_version, [], compute, ttl=FILTER_OPTIONS_CACHE_TTL)
+        return jsonify(result), 200
+    
+    except Exception as e:
+        print(f"Error getting filter options: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/aggregates', methods=['GET'])
+@token_required
+@data_version_etag
+async def aggregates(current_user):
+    """Grouped event counts computed in SQL (same parameters as api.py)"""
+    try:
+        try:
+            bucket, group_by, start, end = parse_aggregate_args(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        async def compute():
+            query, params = aggregates_query(bucket, group_by, start, end)
+            async with get_async_db() as conn:
+                cur = await conn.execute(query, params)
+                rows = await cur.fetchall()
+            return format_aggregates(rows, bucket, group_by)
+        
+        result = await cache.cached_async(
+            'aggregates',
+            g.data_version,
+            [bucket, group_by, request.args.get('start'), request.args.get('end')],
+            compute,
+            ttl=AGGREGATES_CACHE_TTL
+        )
+        return jsonify(result), 200
+    
+    except Exception as e:
+        print(f"Error in aggregates: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/search', methods=['GET'])
+@token_required
+@data_version_etag
+async def search(current_user):
+    """Typo-tolerant lead search (same parameters as api.py)"""
+    try:
+        try:
+            q, limit = parse_search_args(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        query, params = search_query(q, limit)
+        async with get_async_db() as conn:
+            await conn.execute(SEARCH_THRESHOLD_QUERY, (str(SEARCH_SIMILARITY_THRESHOLD),))
+            cur = await conn.execute(query, params)
+            rows = await cur.fetchall()
+        
+        return jsonify({'query': q, 'results': format_search_results(rows)}), 200
+    
+    except Exception as e:
+        print(f"Error in search: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/export', methods=['GET'])
+@token_required
+async def export_events(current_user):
+    """Download every matching event as CSV or Parquet (same parameters as api.py)"""
+    try:
+        fmt, filters, params = parse_export_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    async def generate():
+        async with get_async_db() as conn:
+            async for chunk in iter_export_async(conn, fmt, filters, params):
+                yield chunk
+    
+    response = Response(generate(), mimetype=EXPORT_FORMATS[fmt])
+    response.timeout = None
+    response.headers['Content-Disposition'] = f'attachment; filename="{export_filename(fmt)}"'
+    return response
+
+@app.route('/api/pool-stats', methods=['GET'])
+@token_required
+async def pool_stats(current_user):
+    """Get database connection pool statistics for this process"""
+    try:
+        return jsonify(get_async_pool_stats()), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/cache-stats', methods=['GET'])
+@token_required
+async def cache_stats(current_user):
+    """Get result cache hit/miss counters"""
+    try:
+        return jsonify(await asyncio.to_thread(cache.get_stats)), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/events', methods=['GET'])
+@token_required
+async def events(current_user):
+    """Server-Sent Events: data_changed and rescrape_progress pushes"""
+    response = streaming_response(notify.sse_stream_async(), 'text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/rescrape', methods=['POST'])
+@token_required
+async def rescrape(current_user):
+    """Trigger rescrape task on the Celery workers, or return the one already in flight"""
+    try:
+        data = await request.get_json(silent=True) or {}
+        full_resync = bool(data.get('full_resync'))
+        
+        # Celery's client is blocking - keep it off the event loop
+        task_id, queued = await asyncio.to_thread(trigger_rescrape, full_resync=full_resync)
+        
+        return jsonify({
+            'message': 'Rescrape task queued' if queued else 'Rescrape already in progress',
+            'task_id': task_id,
+            'coalesced': not queued
+        }), 202
+    
+    except Exception as e:
+        print(f"Error in rescrape: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/rescrape-status/<task_id>', methods=['GET'])
+@token_required
+async def rescrape_status(current_user, task_id):
+    """Get rescrape task status from the Celery result backend"""
+    try:
+        return jsonify(await asyncio.to_thread(get_task_status, task_id)), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/metrics', methods=['GET'])
+async def prometheus_metrics():
+    """Prometheus metrics for every worker (METRICS_TOKEN bearer auth if set)"""
+    if not metrics.authorized(request.headers.get('Authorization')):
+        return jsonify({'message': 'Invalid token'}), 401
+    
+    metrics.observe_pool(get_async_pool_stats())
+    body, content_type = await asyncio.to_thread(metrics.render)
+    return Response(body, content_type=content_type)
+
+@app.after_request
+async def record_request_metrics(response):
+    """Record route latency and refresh this worker's pool gauges"""
+    if 'metrics_started' in g:
+        metrics.finish_request(request.method, g.metrics_route, response.status_code, g.metrics_started)
+        metrics.observe_pool(get_async_pool_stats())
+    return response
+
+@app.after_request
+async def compress_response(response):
+    """Compress JSON responses with the best encoding the client accepts"""
+    if (response.status_code != 200 or not isinstance(response.response, DataBody)
+            or response.mimetype != 'application/json' or 'Content-Encoding' in response.headers):
+        return response
+    
+    response.vary.add('Accept-Encoding')
+    data = await response.get_data()
+    if len(data) < pages.COMPRESS_MIN_BYTES:
+        return response
+    
+    # Compressing a large listing takes milliseconds - do it off the loop
+    data, encoding = await asyncio.to_thread(pages.compress_body, data, request.accept_encodings)
+    if encoding:
+        response.set_data(data)
+        response.headers['Content-Encoding'] = encoding
+    
+    return response
+
+@app.errorhandler(404)
+async def not_found(error):
+    return jsonify({'error': 'Not found'}), 404
+
+if __name__ == '__main__':
+    port = int(os.getenv('PORT', 10000))
+    app.run(host='0.0.0.0', port=port, debug=False)
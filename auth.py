@@ -0,0 +1,49 @@
+"""
+Dashboard Auth - Credentials & JWT Tokens
+✅ NEW: Shared by the Flask (api.py) and asyncio (api_async.py) servers
+"""
+import os
+import jwt
+from datetime import datetime, timedelta
+
+# ✅ NEW CREDENTIALS
+ADMIN_USERNAME = os.getenv('ADMIN_USERNAME', 'Gharfix_analyst999')
+ADMIN_PASSWORD = os.getenv('ADMIN_PASSWORD', 'Gharfix314159')
+JWT_SECRET = os.getenv('JWT_SECRET', 'your-secret-key-change-in-production')
+JWT_ALGORITHM = 'HS256'
+TOKEN_LIFETIME = timedelta(days=30)
+
+def check_credentials(username, password):
+    """Verify a login against the admin credentials"""
+    return username == ADMIN_USERNAME and password == ADMIN_PASSWORD
+
+def issue_token(username):
+    """Issue a signed JWT for a logged-in user"""
+    return jwt.encode(
+        {
+            'username': username,
+            'exp': datetime.utcnow() + TOKEN_LIFETIME
+        },
+        JWT_SECRET,
+        algorithm=JWT_ALGORITHM
+    )
+
+def get_request_token(headers, args):
+    """Read the bearer token from a request, raising ValueError if malformed.
+    
+    EventSource cannot set headers, so ?token= is accepted for streams only.
+    Returns None when no token was sent.
+    """
+    if 'Authorization' in headers:
+        try:
+            return headers['Authorization'].split(" ")[1]
+        except IndexError:
+            raise ValueError('Invalid token format')
+    if headers.get('Accept') == 'text/event-stream':
+        return args.get('token')
+    return None
+
+def decode_token(token):
+    """Get the username from a token, raising jwt.InvalidTokenError if invalid"""
+    data = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+    return data['username']
@@ -0,0 +1,157 @@
+"""
+Bellevie API Stub - Synthetic Leads for Benchmarks
+✅ NEW: Deterministic lead/event datasets at any scale, served over HTTP
+with the same page-numbered /leads shape the scraper reads
+"""
+import os
+import sys
+import math
+import random
+import threading
+from array import array
+from datetime import datetime, timedelta
+from flask import Flask, request, jsonify
+from werkzeug.serving import make_server
+
+FIRST_NAMES = ('Aarav', 'Vivaan', 'Aditya', 'Ananya', 'Diya', 'Ishaan', 'Kavya', 'Meera',
+               'Rohan', 'Saanvi', 'Arjun', 'Priya', 'Kabir', 'Nisha', 'Vikram', 'Zara')
+LAST_NAMES = ('Sharma', 'Patel', 'Iyer', 'Reddy', 'Gupta', 'Nair', 'Khan', 'Singh',
+              'Mehta', 'Das', 'Joshi', 'Rao', 'Kapoor', 'Bose', 'Pillai', 'Verma')
+SERVICES = ('Plumbing', 'Electrical', 'Carpentry', 'Painting', 'Cleaning',
+            'AC Repair', 'Pest Control', 'Appliance Repair')
+VENDORS = tuple(f'V{n:03d}' for n in range(1, 41))
+RATE_CARDS = ('Standard', 'Premium', 'Express', 'N/A')
+
+# Every lead walks a prefix of one of these status paths, one step per sync
+# round; the path length is the number of events the lead produces.
+STATUS_PATHS = (
+    ('New', 'Contacted', 'Quoted', 'Booked', 'Completed'),
+    ('New', 'Contacted', 'Quoted', 'Cancelled'),
+    ('New', 'Contacted', 'Not Interested'),
+    ('New', 'Duplicate')
+)
+STATUS_PATH_WEIGHTS = (5, 2, 2, 1)
+
+# Weights for how far along its path a lead gets (1..5 steps)
+PATH_LENGTH_WEIGHTS = (30, 25, 20, 15, 10)
+
+EPOCH = datetime(2024, 1, 1)
+
+class SyntheticLeads:
+    """A reproducible lead population sized to roughly `events` lead_events.
+    
+    Leads are generated on demand from (seed, index), so even 10M-event
+    datasets never sit in memory. Round r holds the leads whose status
+    changes in sync round r, which is what an incremental sync would see.
+    """
+    def __init__(self, events, seed=42):
+        self.events = events
+        self.seed = seed
+        self.leads = max(1, math.ceil(events / self.mean_path_length()))
+        self.rounds = len(PATH_LENGTH_WEIGHTS)
+        self._path_lengths = None
+    
+    @staticmethod
+    def mean_path_length():
+        """Expected events per lead under the path and length weights"""
+        expected = 0.0
+        for path, path_weight in zip(STATUS_PATHS, STATUS_PATH_WEIGHTS):
+            for n, length_weight in enumerate(PATH_LENGTH_WEIGHTS):
+                expected += path_weight * length_weight * min(len(path), n + 1)
+        return expected / (sum(STATUS_PATH_WEIGHTS) * sum(PATH_LENGTH_WEIGHTS))
+    
+    def _rng(self, index):
+        return random.Random(self.seed * 1_000_003 + index)
+    
+    @staticmethod
+    def _path(rng):
+        """Draw a lead's status path - always the first draws from its RNG"""
+        path = rng.choices(STATUS_PATHS, STATUS_PATH_WEIGHTS)[0]
+        length = rng.choices(range(1, len(PATH_LENGTH_WEIGHTS) + 1), PATH_LENGTH_WEIGHTS)[0]
+        return path[:length]
+    
+    def profile(self, index):
+        """Static attributes and status path of one lead"""
+        rng = self._rng(index)
+        path = self._path(rng)
+        first_name = rng.choice(FIRST_NAMES)
+        last_name = rng.choice(LAST_NAMES)
+        
+        return {
+            'id': f'BLV{index:08d}',
+            'first_name': first_name,
+            'last_name': last_name,
+            'email': f'{first_name}.{last_name}.{index}@example.com'.lower(),
+            'phone': f'+91{rng.randrange(6000000000, 9999999999)}',
+            'service_name': rng.choice(SERVICES),
+            'vendor': rng.choice(VENDORS),
+            'rate_card': rng.choice(RATE_CARDS),
+            'submitted_at': EPOCH + timedelta(seconds=rng.randrange(365 * 86400)),
+            'path': path
+        }
+    
+    def lead(self, index, round=None):
+        """A lead as Bellevie returns it - at sync round `round`, or its final state"""
+        profile = self.profile(index)
+        path = profile.pop('path')
+        step = len(path) - 1 if round is None else min(round, len(path) - 1)
+        
+        # Each status change is a new submission a few hours after the last
+        profile['submitted_at'] = (profile['submitted_at'] + timedelta(hours=6 * step)).isoformat()
+        profile['status'] = path[step]
+        return profile
+    
+    def path_lengths(self):
+        """Events per lead, computed once (one byte per lead)"""
+        if self._path_lengths is None:
+            self._path_lengths = array('B', (len(self._path(self._rng(i))) for i in range(self.leads)))
+        return self._path_lengths
+    
+    def total_events(self):
+        """Exact number of lead_events the full dataset produces"""
+        return sum(self.path_lengths())
+    
+    def snapshot(self, round):
+        """Yield every lead that changes in a round, at that round's status"""
+        for index, length in enumerate(self.path_lengths()):
+            if length > round:
+                yield self.lead(index, round)
+    
+    def current(self, offset=0, count=None):
+        """Leads in their final state, as a full resync would see them"""
+        stop = self.leads if count is None else min(self.leads, offset + count)
+        return [self.lead(index) for index in range(offset, stop)]
+
+def create_app(dataset, latency=0.0):
+    """Flask app serving dataset.current() as page-numbered /leads"""
+    app = Flask(__name__)
+    
+    @app.route('/leads')
+    def leads():
+        page = max(1, int(request.args.get('page', 1)))
+        per_page = max(1, int(request.args.get('per_page', 500)))
+        if latency:
+            threading.Event().wait(latency)
+        
+        return jsonify({
+            'data': dataset.current((page - 1) * per_page, per_page),
+            'page': page,
+            'total': dataset.leads,
+            'total_pages': math.ceil(dataset.leads / per_page)
+        })
+    
+    return app
+
+def serve(dataset, host='127.0.0.1', port=0, latency=0.0):
+    """Run the stub on a background thread; returns (server, base_url)"""
+    server = make_server(host, port, create_app(dataset, latency), threaded=True)
+    thread = threading.Thread(target=server.serve_forever, name='bellevie-stub', daemon=True)
+    thread.start()
+    return server, f'http://{host}:{server.server_port}'
+
+if __name__ == '__main__':
+    events = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    port = int(os.getenv('PORT', 8099))
+    dataset = SyntheticLeads(events)
+    print(f"🧪 Serving {dataset.leads} synthetic leads (~{events} events) on port {port}")
+    create_app(dataset).run(host='127.0.0.1', port=port, threaded=True)
@@ -0,0 +1,356 @@
+"""
+Benchmark Suite - Sync, Analytics & API Throughput
+✅ NEW: Synthetic Bellevie datasets (10k-10M events) loaded into a local
+Postgres, timed end to end, with rows/sec and p50/p95/p99 written as JSON
+
+The target database is TRUNCATED - never point this at production:
+    python benchmark.py --database-url postgresql://localhost/gharfix_bench --events 100000
+
+Each run writes one JSON file to benchmark_results/ (or --output); runs with
+the same --events/--seed use identical data, so files compare directly.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import threading
+import subprocess
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+import bellevie_stub
+
+RESULTS_DIR = 'benchmark_results'
+PHASES = ('load', 'sync', 'analytics', 'api')
+
+# Paged endpoints - run --requests times each at --concurrency
+API_ENDPOINTS = (
+    '/api/all-analytics',
+    '/api/all-analytics?format=columnar',
+    '/api/filtered-analytics?status=Booked',
+    '/api/filtered-analytics?service=Plumbing&format=columnar',
+    '/api/filter-options',
+    '/api/aggregates?bucket=day&group_by=status',
+    '/api/aggregates?group_by=service_name,vendor_id'
+)
+
+# Full-table streams - run --stream-requests times each
+STREAM_ENDPOINTS = (
+    '/api/all-analytics?stream=ndjson',
+)
+
+def percentiles(samples):
+    """Latency summary in milliseconds for samples in seconds"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    
+    def pick(p):
+        rank = p / 100 * (len(ordered) - 1)
+        low = int(rank)
+        high = min(low + 1, len(ordered) - 1)
+        return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+    
+    return {
+        'p50': round(pick(50) * 1000, 3),
+        'p95': round(pick(95) * 1000, 3),
+        'p99': round(pick(99) * 1000, 3),
+        'max': round(ordered[-1] * 1000, 3),
+        'mean': round(sum(ordered) / len(ordered) * 1000, 3)
+    }
+
+def rate(count, seconds):
+    return round(count / seconds, 1) if seconds > 0 else None
+
+def environment():
+    """Where and on what a run happened, for comparing results files"""
+    from database import get_db
+    
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    
+    with get_db() as conn:
+        postgres = conn.execute('SHOW server_version').fetchone()[0]
+    
+    return {
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'postgres': postgres,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count()
+    }
+
+def reset_database():
+    """Create the schema and empty every table the benchmark writes"""
+    from migrations import migrate
+    from database import get_db, bump_data_version, rebuild_rollups
+    
+    if not migrate():
+        raise RuntimeError('Database migration failed')
+    
+    with get_db() as conn:
+        cur = conn.cursor()
+        cur.execute('TRUNCATE lead_events, lead_current_status, leads, sync_state RESTART IDENTITY CASCADE')
+        bump_data_version(cur)
+        cur.close()
+    
+    # TRUNCATE bypasses the rollup triggers
+    rebuild_rollups()
+
+def bench_load(dataset, batch_size):
+    """Time sync_leads_to_database over every sync round of the dataset"""
+    from scraper import sync_leads_to_database
+    from database import get_rollups, maintain_partitions
+    
+    events_before = get_rollups()['total_events']
+    latencies = []
+    counts = {'new': 0, 'updated': 0, 'status_changed': 0, 'unchanged': 0}
+    rows = 0
+    
+    def flush(batch):
+        started = time.perf_counter()
+        result = sync_leads_to_database(batch)
+        latencies.append(time.perf_counter() - started)
+        if result is None:
+            raise RuntimeError('sync_leads_to_database failed - see log above')
+        for key, value in zip(('new', 'updated', 'status_changed', 'unchanged'), result):
+            counts[key] += value
+    
+    for sync_round in range(dataset.rounds):
+        batch = []
+        for lead in dataset.snapshot(sync_round):
+            batch.append(lead)
+            if len(batch) >= batch_size:
+                flush(batch)
+                rows += len(batch)
+                batch = []
+        if batch:
+            flush(batch)
+            rows += len(batch)
+        print(f"   round {sync_round + 1}/{dataset.rounds}: {rows} leads synced")
+    
+    seconds = sum(latencies)
+    events_written = get_rollups()['total_events'] - events_before
+    
+    # Synthetic months arrive in the default partition - split them out as a
+    # rescrape would, so the later phases query a realistic layout
+    maintain_partitions()
+    return {
+        'rows': rows,
+        'batches': len(latencies),
+        'batch_size': batch_size,
+        'seconds': round(seconds, 3),
+        'rows_per_sec': rate(rows, seconds),
+        'events_written': events_written,
+        'events_per_sec': rate(events_written, seconds),
+        **counts,
+        'batch_latency_ms': percentiles(latencies)
+    }
+
+def bench_sync(limit=None):
+    """Time a full sync_from_bellevie against the stub (HTTP + database)"""
+    from scraper import sync_from_bellevie
+    
+    started = time.perf_counter()
+    totals = sync_from_bellevie(limit=limit)
+    seconds = time.perf_counter() - started
+    if totals is None:
+        return {'error': 'sync_from_bellevie failed - see log above'}
+    
+    return {
+        'rows': totals['written'],
+        'seconds': round(seconds, 3),
+        'rows_per_sec': rate(totals['written'], seconds),
+        'new': totals['new'],
+        'updated': totals['updated'],
+        'status_changed': totals['status_changed'],
+        'unchanged': totals['unchanged']
+    }
+
+def bench_analytics(iterations):
+    """Latency of get_analytics() called back to back"""
+    from scraper import get_analytics
+    
+    get_analytics()
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        if get_analytics() is None:
+            raise RuntimeError('get_analytics failed - see log above')
+        latencies.append(time.perf_counter() - started)
+    
+    return {
+        'iterations': iterations,
+        'calls_per_sec': rate(iterations, sum(latencies)),
+        'latency_ms': percentiles(latencies)
+    }
+
+def serve_api():
+    """Run api.app on a threaded local server; returns (server, base_url)"""
+    from werkzeug.serving import make_server
+    import api
+    
+    server = make_server('127.0.0.1', 0, api.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='benchmark-api', daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+def bench_endpoint(base_url, token, path, requests_count, concurrency):
+    """Hit one endpoint requests_count times from concurrency threads"""
+    import requests
+    
+    local = threading.local()
+    
+    def call(_):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+            session.headers['Authorization'] = f'Bearer {token}'
+        
+        started = time.perf_counter()
+        response = session.get(base_url + path, timeout=600)
+        size = len(response.content)
+        return response.status_code, size, time.perf_counter() - started
+    
+    call(None)
+    latencies = []
+    errors = 0
+    total_bytes = 0
+    
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for status, size, elapsed in pool.map(call, range(requests_count)):
+            if status != 200:
+                errors += 1
+            latencies.append(elapsed)
+            total_bytes += size
+    seconds = time.perf_counter() - started
+    
+    return {
+        'requests': requests_count,
+        'concurrency': concurrency,
+        'errors': errors,
+        'seconds': round(seconds, 3),
+        'requests_per_sec': rate(requests_count, seconds),
+        'bytes_per_request': total_bytes // requests_count,
+        'latency_ms': percentiles(latencies)
+    }
+
+def bench_api(base_url, requests_count, concurrency, stream_requests):
+    """Latency and throughput of every dashboard endpoint under load"""
+    import requests
+    from auth import ADMIN_USERNAME, ADMIN_PASSWORD
+    
+    response = requests.post(f'{base_url}/login', json={'username': ADMIN_USERNAME, 'password': ADMIN_PASSWORD}, timeout=30)
+    response.raise_for_status()
+    token = response.json()['token']
+    
+    results = {}
+    for path in API_ENDPOINTS:
+        results[f'GET {path}'] = bench_endpoint(base_url, token, path, requests_count, concurrency)
+        print(f"   GET {path}: p95 {results[f'GET {path}']['latency_ms']['p95']} ms")
+    for path in STREAM_ENDPOINTS:
+        results[f'GET {path}'] = bench_endpoint(base_url, token, path, stream_requests, 1)
+        print(f"   GET {path}: p95 {results[f'GET {path}']['latency_ms']['p95']} ms")
+    return results
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Benchmark sync, analytics and API throughput on synthetic data')
+    parser.add_argument('--database-url', required=True,
+                        help='dedicated benchmark database - its tables are truncated')
+    parser.add_argument('--events', type=int, default=10000, help='approximate lead_events to generate (10k-10M)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--phases', default=','.join(PHASES), help=f'comma-separated subset of {",".join(PHASES)}')
+    parser.add_argument('--no-reset', action='store_true', help='keep existing data (skips truncation)')
+    parser.add_argument('--batch-size', type=int, default=5000, help='leads per sync_leads_to_database call')
+    parser.add_argument('--sync-limit', type=int, help='cap leads fetched in the stub sync phase')
+    parser.add_argument('--stub-latency', type=float, default=0.0, help='ms the Bellevie stub waits per page')
+    parser.add_argument('--analytics-iterations', type=int, default=200)
+    parser.add_argument('--api-url', help='benchmark an already running server instead of api.py in-process')
+    parser.add_argument('--requests', type=int, default=200, help='requests per API endpoint')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--stream-requests', type=int, default=4)
+    parser.add_argument('--output', help=f'results file (default {RESULTS_DIR}/<timestamp>.json)')
+    
+    args = parser.parse_args(argv)
+    args.phases = [phase for phase in args.phases.split(',') if phase]
+    unknown = set(args.phases) - set(PHASES)
+    if unknown:
+        parser.error(f'unknown phases: {", ".join(sorted(unknown))}')
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    started_at = datetime.now(timezone.utc)
+    
+    dataset = bellevie_stub.SyntheticLeads(args.events, seed=args.seed)
+    stub, stub_url = bellevie_stub.serve(dataset, latency=args.stub_latency / 1000)
+    
+    # Read at import by database/scraper - set before importing them
+    os.environ['DATABASE_URL'] = args.database_url
+    os.environ['BELLEVIE_API_URL'] = stub_url
+    os.environ.setdefault('BELLEVIE_API_KEY', 'benchmark')
+    
+    print(f"🧪 Benchmark: {dataset.leads} leads, ~{args.events} events, phases {','.join(args.phases)}")
+    
+    report = {
+        'benchmark': 'gharfix',
+        'started_at': started_at.isoformat(),
+        'environment': environment(),
+        'config': {key: value for key, value in vars(args).items() if key != 'database_url'},
+        'dataset': {
+            'seed': args.seed,
+            'leads': dataset.leads,
+            'events': dataset.total_events(),
+            'rounds': dataset.rounds
+        },
+        'results': {}
+    }
+    results = report['results']
+    
+    try:
+        if not args.no_reset:
+            reset_database()
+        
+        if 'load' in args.phases:
+            print("⏱️  sync_leads_to_database...")
+            results['sync_leads_to_database'] = bench_load(dataset, args.batch_size)
+        
+        if 'sync' in args.phases:
+            print("⏱️  sync_from_bellevie against the stub...")
+            results['sync_from_bellevie'] = bench_sync(args.sync_limit)
+        
+        if 'analytics' in args.phases:
+            print("⏱️  get_analytics...")
+            results['get_analytics'] = bench_analytics(args.analytics_iterations)
+        
+        if 'api' in args.phases:
+            server = None
+            base_url = args.api_url
+            if not base_url:
+                server, base_url = serve_api()
+            print(f"⏱️  API endpoints at {base_url}...")
+            try:
+                results['api'] = bench_api(base_url.rstrip('/'), args.requests, args.concurrency, args.stream_requests)
+            finally:
+                if server:
+                    server.shutdown()
+    finally:
+        stub.shutdown()
+    
+    report['finished_at'] = datetime.now(timezone.utc).isoformat()
+    
+    output = args.output or os.path.join(RESULTS_DIR, f"{started_at.strftime('%Y%m%dT%H%M%SZ')}-{args.events}.json")
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    
+    print(f"✅ Results written to {output}")
+    return report
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,165 @@
+"""
+Redis Result Cache - Filter Options & Filtered Analytics
+✅ NEW: Per-query keys, TTLs, entry size bound, data-version keyed entries
+✅ NEW: Total size bound - oldest entries are evicted past CACHE_MAX_BYTES
+
+Keys embed the data version the request read, so a sync's commit is its
+own invalidation: nothing can serve pre-commit data under a new version.
+Superseded entries are evicted oldest-first by the size bound (or expire
+through their TTL), so the cache never relies on Redis maxmemory - the
+same Redis may be the Celery broker. A dedicated CACHE_REDIS_URL with
+maxmemory-policy allkeys-lru is still a good idea for big deployments.
+"""
+import json
+import time
+import asyncio
+import hashlib
+import redis
+from config import CACHE_REDIS_URL, CACHE_KEY_PREFIX, CACHE_DEFAULT_TTL, CACHE_MAX_ENTRY_BYTES, CACHE_MAX_BYTES
+
+STATS_KEY = f'{CACHE_KEY_PREFIX}:stats'
+
+# Entry bookkeeping for the total bound: insertion order and sizes
+INDEX_KEY = f'{CACHE_KEY_PREFIX}:index'
+SIZES_KEY = f'{CACHE_KEY_PREFIX}:sizes'
+TOTAL_KEY = f'{CACHE_KEY_PREFIX}:bytes'
+
+# Store one entry and evict the oldest until the total fits, atomically.
+# Entries that already expired still count until evicted, so the bound is
+# conservative. Returns the number evicted.
+STORE_SCRIPT = '''
+local entry, index, sizes, total_key = KEYS[1], KEYS[2], KEYS[3], KEYS[4]
+local size = string.len(ARGV[1])
+local previous = tonumber(redis.call('hget', sizes, entry) or '0')
+redis.call('set', entry, ARGV[1], 'EX', ARGV[2])
+redis.call('zadd', index, ARGV[3], entry)
+redis.call('hset', sizes, entry, size)
+local total = redis.call('incrby', total_key, size - previous)
+local evicted = 0
+while total > tonumber(ARGV[4]) do
+    local oldest = redis.call('zpopmin', index)
+    if #oldest == 0 then
+        break
+    end
+    local victim_size = tonumber(redis.call('hget', sizes, oldest[1]) or '0')
+    redis.call('hdel', sizes, oldest[1])
+    redis.call('del', oldest[1])
+    total = redis.call('incrby', total_key, -victim_size)
+    evicted = evicted + 1
+end
+return evicted
+'''
+
+_client = None
+
+def get_client():
+    """Get the shared Redis client (redis-py pools connections per process)"""
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(
+            CACHE_REDIS_URL,
+            socket_timeout=1,
+            socket_connect_timeout=1,
+            decode_responses=True
+        )
+    return _client
+
+def make_key(name, version, params):
+    """Build the cache key for one query and its parameters at a data version"""
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()
+    return f'{CACHE_KEY_PREFIX}:v{version}:{name}:{digest}'
+
+def lookup(name, version, params):
+    """Look up a cached result; returns (key, value).
+    
+    value is None on a miss; key is None when Redis is unavailable or the
+    data version is unknown, in which case the result should be computed
+    but not stored.
+    """
+    if version is None:
+        return None, None
+    
+    try:
+        key = make_key(name, version, params)
+        raw = get_client().get(key)
+    except redis.RedisError as e:
+        print(f"⚠️  Cache unavailable: {e}")
+        return None, None
+    
+    if raw is not None:
+        _count(f'{name}:hits')
+        return key, json.loads(raw)
+    
+    _count(f'{name}:misses')
+    return key, None
+
+def store(name, key, value, ttl=CACHE_DEFAULT_TTL):
+    """Store a computed result unless it exceeds CACHE_MAX_ENTRY_BYTES.
+    
+    Older entries are evicted to keep the cache under CACHE_MAX_BYTES.
+    """
+    payload = json.dumps(value)
+    if len(payload.encode()) > CACHE_MAX_ENTRY_BYTES:
+        _count(f'{name}:oversize')
+        return
+    
+    try:
+        evicted = get_client().eval(STORE_SCRIPT, 4, key, INDEX_KEY, SIZES_KEY, TOTAL_KEY,
+                                    payload, ttl, time.time(), CACHE_MAX_BYTES)
+        if evicted:
+            _count('evictions', evicted)
+    except redis.RedisError as e:
+        print(f"⚠️  Cache write failed: {e}")
+
+def cached(name, version, params, compute, ttl=CACHE_DEFAULT_TTL):
+    """Return the cached JSON-able result of compute(), computing on a miss.
+    
+    version is the data version the request read (data_version_etag puts
+    it in g.data_version); None bypasses the cache. Redis errors never
+    fail the request - they fall through to compute(). Results larger than
+    CACHE_MAX_ENTRY_BYTES are not stored.
+    """
+    key, value = lookup(name, version, params)
+    if value is not None:
+        return value
+    
+    value = compute()
+    if key is not None:
+        store(name, key, value, ttl)
+    return value
+
+async def cached_async(name, version, params, compute, ttl=CACHE_DEFAULT_TTL):
+    """cached() for the asyncio server - compute is a coroutine function.
+    
+    The short Redis round trips run on the default thread pool so they never
+    block the event loop.
+    """
+    key, value = await asyncio.to_thread(lookup, name, version, params)
+    if value is not None:
+        return value
+    
+    value = await compute()
+    if key is not None:
+        await asyncio.to_thread(store, name, key, value, ttl)
+    return value
+
+def _count(field, amount=1):
+    """Increment a shared hit/miss counter"""
+    try:
+        get_client().hincrby(STATS_KEY, field, amount)
+    except redis.RedisError:
+        pass
+
+def get_stats():
+    """Get cache hit/miss counters (shared across all workers)"""
+    try:
+        client = get_client()
+        counters = {field: int(value) for field, value in client.hgetall(STATS_KEY).items()}
+        return {
+            'entries': client.zcard(INDEX_KEY),
+            'bytes': int(client.get(TOTAL_KEY) or 0),
+            'max_bytes': CACHE_MAX_BYTES,
+            'counters': counters
+        }
+    except redis.RedisError as e:
+        return {'error': str(e)}
@@ -2,12 +2,12 @@
 Celery App Initialization
 ✅ FIXED: Proper Redis configuration for background tasks
 """
+from datetime import timedelta
 from celery import Celery
-from config import CELERY_BROKER_URL, CELERY_RESULT_BACKEND
-import os
+from config import CELERY_BROKER_URL, CELERY_RESULT_BACKEND, SYNC_INTERVAL_MINUTES
 
 # Initialize Celery
-celery_app = Celery('gharfix')
+celery_app = Celery('gharfix', include=['tasks'])
 
 # Configure from environment
 celery_app.conf.update(
@@ -24,5 +24,17 @@ celery_app.conf.update(
     broker_connection_retry_on_startup=True,
 )
 
+# Periodic incremental sync (run `celery -A celery_app beat` once). Runs
+# that find a sync already holding the lock exit straight away, and
+# 'expires' drops beats that sat in the queue past the next one.
+if SYNC_INTERVAL_MINUTES > 0:
+    celery_app.conf.beat_schedule = {
+        'incremental-sync': {
+            'task': 'tasks.rescrape_data',
+            'schedule': timedelta(minutes=SYNC_INTERVAL_MINUTES),
+            'options': {'expires': SYNC_INTERVAL_MINUTES * 60}
+        }
+    }
+
 # Auto-discover tasks
 celery_app.autodiscover_tasks(['tasks'])
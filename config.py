@@ -30,6 +30,36 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
 
+# Result cache (Redis)
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+CACHE_KEY_PREFIX = os.getenv('CACHE_KEY_PREFIX', 'gharfix:cache')
+CACHE_DEFAULT_TTL = int(os.getenv('CACHE_DEFAULT_TTL', 300))
+CACHE_MAX_ENTRY_BYTES = int(os.getenv('CACHE_MAX_ENTRY_BYTES', 1024 * 1024))
+CACHE_MAX_BYTES = int(os.getenv('CACHE_MAX_BYTES', 64 * 1024 * 1024))  # whole cache
+
+# Dashboard push events (Redis pub/sub -> Server-Sent Events)
+EVENTS_REDIS_URL = os.getenv('EVENTS_REDIS_URL', os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+EVENTS_CHANNEL = os.getenv('EVENTS_CHANNEL', 'gharfix:events')
+SSE_HEARTBEAT_SECONDS = int(os.getenv('SSE_HEARTBEAT_SECONDS', 15))
+SSE_MAX_DURATION = int(os.getenv('SSE_MAX_DURATION', 300))
+# The Flask app serves each open stream from a gunicorn thread (GUNICORN_THREADS
+# per worker, see Procfile). At most SSE_MAX_STREAMS of them per worker go to
+# streams; beyond that a tab is told to retry later, so API calls always get
+# a thread. api_async (Quart) has no such limit.
+GUNICORN_THREADS = int(os.getenv('GUNICORN_THREADS', 32))
+SSE_MAX_STREAMS = int(os.getenv('SSE_MAX_STREAMS', GUNICORN_THREADS // 2))
+SSE_BUSY_RETRY_SECONDS = int(os.getenv('SSE_BUSY_RETRY_SECONDS', 30))
+
+# Sync scheduling & locking - one rescrape at a time across workers
+SYNC_LOCK_REDIS_URL = os.getenv('SYNC_LOCK_REDIS_URL', os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+SYNC_LOCK_KEY = os.getenv('SYNC_LOCK_KEY', 'gharfix:sync:lock')
+SYNC_LOCK_TTL = int(os.getenv('SYNC_LOCK_TTL', 40 * 60))  # outlives task_time_limit
+SYNC_INTERVAL_MINUTES = float(os.getenv('SYNC_INTERVAL_MINUTES', 15))  # 0 disables the beat schedule
+
+# Rescrape metrics - the Celery worker publishes run totals here for /metrics
+METRICS_REDIS_URL = os.getenv('METRICS_REDIS_URL', os.getenv('REDIS_URL', 'redis://localhost:6379/0'))
+METRICS_RESCRAPE_KEY = os.getenv('METRICS_RESCRAPE_KEY', 'gharfix:metrics:rescrape')
+
 # Bellevie API
 BELLEVIE_API_KEY = os.getenv('BELLEVIE_API_KEY', 'your-api-key')
 BELLEVIE_API_URL = os.getenv('BELLEVIE_API_URL', 'https://api.bellevie.com')
@@ -0,0 +1,227 @@
+"""
+Lead Event Export - Streaming CSV (COPY) and Parquet
+✅ NEW: /api/export and a CLI that stream lead_events JOIN leads with the
+dashboard's status/service/date filters, in constant memory
+
+CSV comes straight from COPY ... TO STDOUT, block by block; Parquet is
+written one row group at a time from a server-side cursor:
+    python export.py --status Booked --start 2024-01-01 -o booked.csv
+    python export.py --format parquet -o events.parquet
+"""
+import io
+import os
+import sys
+import uuid
+import asyncio
+import argparse
+from datetime import date
+from queries import parse_date_range, event_filters
+from database import get_db
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pyarrow is optional - only ?format=parquet needs it
+    pyarrow = None
+
+# Rows per Parquet row group - also the server-side cursor fetch size
+EXPORT_ROW_GROUP_SIZE = int(os.getenv('EXPORT_ROW_GROUP_SIZE', 100000))
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet'
+}
+
+EXPORT_COLUMNS = '''
+    le.event_id,
+    l.customer_id,
+    l.first_name,
+    l.last_name,
+    l.email,
+    l.phone,
+    le.service_name,
+    le.status,
+    le.vendor_id,
+    le.rate_card,
+    le.submitted_at
+'''
+
+def parse_export_format(args):
+    """Read ?format= for an export, raising ValueError"""
+    fmt = args.get('format') or 'csv'
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    if fmt == 'parquet' and pyarrow is None:
+        raise ValueError('parquet export needs pyarrow installed')
+    return fmt
+
+def parse_export_args(args):
+    """Read format/status/service/start/end; returns (fmt, filters, params)"""
+    fmt = parse_export_format(args)
+    start, end = parse_date_range(args)
+    filters, params = event_filters(args.get('status'), args.get('service'), start, end)
+    return fmt, filters, params
+
+def export_filename(fmt):
+    """Download name for an export started today"""
+    return f'lead_events_{date.today():%Y%m%d}.{fmt}'
+
+def export_query(filters):
+    """Unordered join of events and leads - an ORDER BY would sort the whole table first"""
+    query = f'''
+        SELECT {EXPORT_COLUMNS}
+        FROM lead_events le
+        JOIN leads l ON le.customer_id = l.customer_id
+    '''
+    if filters:
+        query += ' WHERE ' + ' AND '.join(filters)
+    return query
+
+def copy_statement(filters):
+    """COPY the export query to the client as CSV with a header row"""
+    return f'COPY ({export_query(filters)}) TO STDOUT WITH (FORMAT csv, HEADER true)'
+
+def parquet_schema():
+    """Arrow schema matching EXPORT_COLUMNS"""
+    return pyarrow.schema([
+        ('event_id', pyarrow.int64()),
+        ('customer_id', pyarrow.string()),
+        ('first_name', pyarrow.string()),
+        ('last_name', pyarrow.string()),
+        ('email', pyarrow.string()),
+        ('phone', pyarrow.string()),
+        ('service_name', pyarrow.string()),
+        ('status', pyarrow.string()),
+        ('vendor_id', pyarrow.string()),
+        ('rate_card', pyarrow.string()),
+        ('submitted_at', pyarrow.timestamp('us'))
+    ])
+
+class ChunkSink(io.RawIOBase):
+    """Write-only file that hands back what was written since the last drain.
+    
+    ParquetWriter records byte offsets via tell(), so the position keeps
+    counting even though drained bytes are no longer held.
+    """
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self.position = 0
+    
+    def writable(self):
+        return True
+    
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+    
+    def tell(self):
+        return self.position
+    
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+class ParquetEncoder:
+    """Turn batches of export rows into Parquet bytes, one row group per batch"""
+    def __init__(self):
+        self.schema = parquet_schema()
+        self.sink = ChunkSink()
+        self.writer = pyarrow.parquet.ParquetWriter(self.sink, self.schema, compression='zstd')
+    
+    def encode(self, rows):
+        columns = list(zip(*rows))
+        table = pyarrow.Table.from_arrays(
+            [pyarrow.array(column, type=field.type) for column, field in zip(columns, self.schema)],
+            schema=self.schema
+        )
+        self.writer.write_table(table)
+        return self.sink.drain()
+    
+    def close(self):
+        """Finish the file (footer included); returns the remaining bytes"""
+        self.writer.close()
+        return self.sink.drain()
+
+def iter_csv(conn, filters, params):
+    """Yield CSV blocks from COPY TO STDOUT as Postgres sends them"""
+    with conn.cursor().copy(copy_statement(filters), params) as copy:
+        for block in copy:
+            yield bytes(block)
+
+def iter_parquet(conn, filters, params):
+    """Yield a Parquet file a row group at a time from a named cursor"""
+    encoder = ParquetEncoder()
+    with conn.cursor(name=f'export_{uuid.uuid4().hex}') as cur:
+        cur.itersize = EXPORT_ROW_GROUP_SIZE
+        cur.execute(export_query(filters), params)
+        while True:
+            rows = cur.fetchmany(EXPORT_ROW_GROUP_SIZE)
+            if not rows:
+                break
+            yield encoder.encode(rows)
+    yield encoder.close()
+
+def iter_export(conn, fmt, filters, params):
+    """Yield the export's bytes in the requested format"""
+    if fmt == 'parquet':
+        return iter_parquet(conn, filters, params)
+    return iter_csv(conn, filters, params)
+
+async def iter_csv_async(conn, filters, params):
+    """iter_csv() on an AsyncConnection"""
+    async with conn.cursor().copy(copy_statement(filters), params) as copy:
+        async for block in copy:
+            yield bytes(block)
+
+async def iter_parquet_async(conn, filters, params):
+    """iter_parquet() on an AsyncConnection; encoding runs off the event loop"""
+    encoder = ParquetEncoder()
+    async with conn.cursor(name=f'export_{uuid.uuid4().hex}') as cur:
+        cur.itersize = EXPORT_ROW_GROUP_SIZE
+        await cur.execute(export_query(filters), params)
+        while True:
+            rows = await cur.fetchmany(EXPORT_ROW_GROUP_SIZE)
+            if not rows:
+                break
+            yield await asyncio.to_thread(encoder.encode, rows)
+    yield await asyncio.to_thread(encoder.close)
+
+def iter_export_async(conn, fmt, filters, params):
+    """iter_export() on an AsyncConnection"""
+    if fmt == 'parquet':
+        return iter_parquet_async(conn, filters, params)
+    return iter_csv_async(conn, filters, params)
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Export lead events as CSV or Parquet')
+    parser.add_argument('--format', choices=tuple(EXPORT_FORMATS), default='csv')
+    parser.add_argument('--status', help='only events with this status')
+    parser.add_argument('--service', help='only events for this service')
+    parser.add_argument('--start', help='submitted on or after this ISO date')
+    parser.add_argument('--end', help='submitted before this ISO date')
+    parser.add_argument('-o', '--output', help='file to write (default: stdout)')
+    args = parser.parse_args(argv)
+    
+    try:
+        fmt, filters, params = parse_export_args(vars(args))
+    except ValueError as e:
+        parser.error(str(e))
+    
+    out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    written = 0
+    try:
+        with get_db() as conn:
+            for chunk in iter_export(conn, fmt, filters, params):
+                out.write(chunk)
+                written += len(chunk)
+    finally:
+        if args.output:
+            out.close()
+    
+    print(f"✅ Exported {written / 1e6:.1f} MB of {fmt}", file=sys.stderr)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
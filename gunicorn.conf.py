@@ -0,0 +1,21 @@
+"""
+Gunicorn Settings - Prometheus Multiprocess Metrics
+✅ NEW: Every worker writes its metrics to PROMETHEUS_MULTIPROC_DIR so
+/metrics reports the whole dyno, whichever worker answers the scrape
+"""
+import os
+import shutil
+
+# Must be set before the workers import prometheus_client
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/gharfix-metrics')
+
+def on_starting(server):
+    """Start every deploy with an empty metrics directory"""
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+def child_exit(server, worker):
+    """Drop a dead worker's live gauges (in-flight requests, pool usage)"""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
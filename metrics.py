@@ -0,0 +1,228 @@
+"""
+Prometheus Metrics - Requests, Queries, Pool & Rescrapes
+✅ NEW: /metrics in Prometheus text format, aggregated across gunicorn workers
+
+With PROMETHEUS_MULTIPROC_DIR set (gunicorn.conf.py does this), every
+process writes its samples to files there and /metrics merges them, so a
+scrape answered by any one worker covers them all. Rescrapes run on the
+Celery worker, which serves no HTTP - it adds each run's totals to a Redis
+hash (METRICS_RESCRAPE_KEY) and /metrics reads them back from there.
+"""
+import os
+import re
+import time
+import redis
+from functools import lru_cache
+from prometheus_client import (
+    REGISTRY, CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram,
+    generate_latest, multiprocess
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, HistogramMetricFamily
+from prometheus_client.utils import floatToGoString
+from config import METRICS_REDIS_URL, METRICS_RESCRAPE_KEY
+
+PROMETHEUS_MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+
+# Queries slower than this are logged and counted
+DB_SLOW_QUERY_MS = float(os.getenv('DB_SLOW_QUERY_MS', 500))
+
+# Bearer token required for /metrics when set
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+QUERY_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+RESCRAPE_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+
+REQUESTS = Counter('gharfix_http_requests_total', 'HTTP requests', ['method', 'route', 'status'])
+REQUEST_LATENCY = Histogram('gharfix_http_request_duration_seconds', 'Time to build the HTTP response',
+                            ['method', 'route'])
+REQUESTS_IN_PROGRESS = Gauge('gharfix_http_requests_in_progress', 'HTTP requests being handled',
+                             ['method', 'route'], multiprocess_mode='livesum')
+
+QUERY_LATENCY = Histogram('gharfix_db_query_duration_seconds', 'Database query execution time',
+                          ['query'], buckets=QUERY_BUCKETS)
+SLOW_QUERIES = Counter('gharfix_db_slow_queries_total', 'Queries slower than DB_SLOW_QUERY_MS', ['query'])
+
+POOL_SIZE = Gauge('gharfix_db_pool_size', 'Open pooled connections', multiprocess_mode='livesum')
+POOL_AVAILABLE = Gauge('gharfix_db_pool_available', 'Idle pooled connections', multiprocess_mode='livesum')
+POOL_WAITING = Gauge('gharfix_db_pool_requests_waiting', 'Requests queued for a connection',
+                     multiprocess_mode='livesum')
+POOL_MAX = Gauge('gharfix_db_pool_max_size', 'Pool size limit', multiprocess_mode='livesum')
+POOL_REQUESTS = Counter('gharfix_db_pool_requests_total', 'Connections requested from the pool')
+POOL_QUEUED = Counter('gharfix_db_pool_requests_queued_total', 'Connection requests that had to wait')
+POOL_WAIT = Counter('gharfix_db_pool_wait_seconds_total', 'Time spent waiting for a connection')
+POOL_ERRORS = Counter('gharfix_db_pool_errors_total', 'Connection requests that failed or timed out')
+
+# Rescrape run totals kept in Redis, as (totals key, metric name, help)
+RESCRAPE_COUNTERS = (
+    ('fetched', 'gharfix_rescrape_leads_fetched', 'Leads fetched from Bellevie'),
+    ('written', 'gharfix_rescrape_rows_written', 'Leads written to the database'),
+    ('unchanged', 'gharfix_rescrape_leads_unchanged', 'Leads skipped as unchanged (content hash)'),
+    ('status_changed', 'gharfix_rescrape_status_changes', 'New status events recorded')
+)
+# Rescrape histograms, as (Redis field prefix, metric name, help)
+RESCRAPE_HISTOGRAMS = (
+    ('duration', 'gharfix_rescrape_duration_seconds', 'Whole rescrape run time'),
+    ('fetch', 'gharfix_rescrape_fetch_duration_seconds', 'Time fetching from Bellevie')
+)
+
+# psycopg_pool counters we mirror, as (stats key, metric, scale)
+POOL_COUNTERS = (
+    ('requests_num', POOL_REQUESTS, 1),
+    ('requests_queued', POOL_QUEUED, 1),
+    ('requests_wait_ms', POOL_WAIT, 0.001),
+    ('requests_errors', POOL_ERRORS, 1)
+)
+
+_pool_counters = {}
+_redis = None
+
+def get_redis():
+    """Get the shared Redis client for rescrape metrics"""
+    global _redis
+    if _redis is None:
+        _redis = redis.Redis.from_url(
+            METRICS_REDIS_URL,
+            socket_timeout=5,
+            socket_connect_timeout=5,
+            decode_responses=True
+        )
+    return _redis
+
+@lru_cache(maxsize=1024)
+def query_label(sql):
+    """Low-cardinality label for a statement: operation and main table"""
+    words = sql.split(None, 1)
+    operation = words[0].upper() if words else 'UNKNOWN'
+    match = re.search(r'\b(?:FROM|INTO|UPDATE|TABLE|JOIN)\s+(\w+)', sql, re.IGNORECASE)
+    return f'{operation} {match.group(1)}' if match else operation
+
+def query_text(query, conn=None):
+    """SQL text of a str, bytes or psycopg.sql query (rendered against conn)"""
+    if isinstance(query, str):
+        return query
+    if isinstance(query, bytes):
+        return query.decode('utf-8', 'replace')
+    return query.as_string(conn)
+
+def observe_query(query, seconds, conn=None):
+    """Record one query's execution time; log it if slow"""
+    sql = query_text(query, conn)
+    if not sql.strip():
+        # The pool's check_connection runs an empty statement on every checkout
+        return
+    label = query_label(sql)
+    QUERY_LATENCY.labels(label).observe(seconds)
+    
+    if seconds * 1000 >= DB_SLOW_QUERY_MS:
+        SLOW_QUERIES.labels(label).inc()
+        print(f"🐢 Slow query ({seconds * 1000:.0f} ms, {label}): {' '.join(sql.split())[:500]}")
+
+def observe_pool(stats):
+    """Mirror a pool's get_stats() into gauges and cumulative counters"""
+    if not stats.get('pool_open'):
+        return
+    
+    POOL_SIZE.set(stats.get('pool_size', 0))
+    POOL_AVAILABLE.set(stats.get('pool_available', 0))
+    POOL_WAITING.set(stats.get('requests_waiting', 0))
+    POOL_MAX.set(stats.get('pool_max', 0))
+    
+    # get_stats() counters are cumulative per pool - add only what's new
+    for key, counter, scale in POOL_COUNTERS:
+        value = stats.get(key, 0)
+        previous = _pool_counters.get((stats.get('pool_name'), key), 0)
+        if value > previous:
+            counter.inc((value - previous) * scale)
+        _pool_counters[(stats.get('pool_name'), key)] = value
+
+def start_request(method, route):
+    """Mark a request in flight; returns its start time"""
+    REQUESTS_IN_PROGRESS.labels(method, route).inc()
+    return time.perf_counter()
+
+def finish_request(method, route, status, started):
+    """Record a handled request's latency and status"""
+    REQUEST_LATENCY.labels(method, route).observe(time.perf_counter() - started)
+    REQUESTS.labels(method, route, str(status)).inc()
+
+def end_request(method, route):
+    """Mark a request no longer in flight (runs even when a handler raised)"""
+    REQUESTS_IN_PROGRESS.labels(method, route).dec()
+
+def _observe_histogram(pipe, name, seconds):
+    """Add one observation to a Redis-backed histogram (cumulative buckets)"""
+    for bound in RESCRAPE_BUCKETS:
+        if seconds <= bound:
+            pipe.hincrby(METRICS_RESCRAPE_KEY, f'{name}:le:{bound}', 1)
+    pipe.hincrby(METRICS_RESCRAPE_KEY, f'{name}:count', 1)
+    pipe.hincrbyfloat(METRICS_RESCRAPE_KEY, f'{name}:sum', seconds)
+
+def observe_rescrape(totals, seconds):
+    """Record one full_rescrape run in Redis; totals is None when it failed"""
+    try:
+        pipe = get_redis().pipeline(transaction=True)
+        _observe_histogram(pipe, 'duration', seconds)
+        if totals is None:
+            pipe.hincrby(METRICS_RESCRAPE_KEY, 'runs:failed', 1)
+        else:
+            pipe.hincrby(METRICS_RESCRAPE_KEY, 'runs:succeeded', 1)
+            if totals.get('fetch_seconds') is not None:
+                _observe_histogram(pipe, 'fetch', totals['fetch_seconds'])
+            for key, _, _ in RESCRAPE_COUNTERS:
+                pipe.hincrby(METRICS_RESCRAPE_KEY, key, totals.get(key, 0))
+            if seconds > 0:
+                pipe.hset(METRICS_RESCRAPE_KEY, 'leads_per_second', totals['written'] / seconds)
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"⚠️ Could not record rescrape metrics: {e}")
+
+class RescrapeCollector:
+    """Rescrape metrics from the totals the Celery worker keeps in Redis"""
+    def describe(self):
+        # Nothing to declare up front - keeps registering from reaching Redis
+        return []
+    
+    def collect(self):
+        try:
+            totals = get_redis().hgetall(METRICS_RESCRAPE_KEY)
+        except redis.RedisError as e:
+            print(f"⚠️ Could not read rescrape metrics: {e}")
+            return
+        
+        def value(field):
+            return float(totals.get(field, 0))
+        
+        runs = CounterMetricFamily('gharfix_rescrape_runs', 'Rescrape runs', labels=['result'])
+        for result in ('succeeded', 'failed'):
+            runs.add_metric([result], value(f'runs:{result}'))
+        yield runs
+        
+        for name, metric, documentation in RESCRAPE_HISTOGRAMS:
+            buckets = [(floatToGoString(bound), value(f'{name}:le:{bound}')) for bound in RESCRAPE_BUCKETS]
+            buckets.append(('+Inf', value(f'{name}:count')))
+            yield HistogramMetricFamily(metric, documentation, buckets=buckets, sum_value=value(f'{name}:sum'))
+        
+        for key, metric, documentation in RESCRAPE_COUNTERS:
+            yield CounterMetricFamily(metric, documentation, value=value(key))
+        
+        if 'leads_per_second' in totals:
+            yield GaugeMetricFamily('gharfix_rescrape_leads_per_second', 'Leads synced per second, last run',
+                                    value=value('leads_per_second'))
+
+RESCRAPE_COLLECTOR = RescrapeCollector()
+if not PROMETHEUS_MULTIPROC_DIR:
+    REGISTRY.register(RESCRAPE_COLLECTOR)
+
+def render():
+    """Current metrics in Prometheus text format, as (body, content type)"""
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(RESCRAPE_COLLECTOR)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+def authorized(authorization):
+    """Whether an Authorization header may read /metrics"""
+    return not METRICS_TOKEN or authorization == f'Bearer {METRICS_TOKEN}'
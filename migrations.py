@@ -0,0 +1,307 @@
+"""
+Schema Migrations - Versioned, Applied Once at Release
+✅ NEW: schema_version table; replaces init_db() on every worker start and sync
+
+Run by the Procfile release step:
+    python migrations.py            # apply pending migrations, maintain partitions
+    python migrations.py status     # print the current and latest versions
+
+Add a migration by appending (version, description, function) to
+MIGRATIONS; each one runs in its own transaction and is recorded in
+schema_version, so it never runs twice.
+"""
+import sys
+from database import (
+    get_db, maintain_partitions, ROLLUP_FUNCTIONS_SQL, ROLLUP_TRIGGERS, CURRENT_STATUS_FUNCTION_SQL,
+    CURRENT_STATUS_TRIGGER_SQL, _rebuild_rollups, _rebuild_current_status, _create_lead_events,
+    _partition_lead_events
+)
+
+# Advisory lock key - serializes concurrent runners (e.g. overlapping releases)
+MIGRATION_LOCK_ID = 4_720_019
+
+SCHEMA_VERSION_SQL = '''
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+def baseline_schema(cur):
+    """Everything init_db() used to create.
+    
+    Idempotent, so it also adopts databases created before schema_version
+    existed (including the one-off lead_events partitioning).
+    """
+    # Create leads table with all columns including timestamps
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS leads (
+            customer_id TEXT PRIMARY KEY,
+            first_name TEXT,
+            last_name TEXT,
+            email TEXT,
+            phone TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Check if created_at column exists in leads table
+    cur.execute('''
+        SELECT column_name 
+        FROM information_schema.columns 
+        WHERE table_name='leads' AND column_name='created_at'
+    ''')
+    
+    if not cur.fetchone():
+        # Add missing columns if table exists without them
+        print("Adding missing timestamp columns to leads table...")
+        cur.execute('''
+            ALTER TABLE leads 
+            ADD COLUMN IF NOT EXISTS created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ''')
+    
+    # Create lead_events, partitioned by month on submitted_at
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('lead_events')")
+    row = cur.fetchone()
+    if row and row[0] == 'r':
+        _partition_lead_events(cur)
+    else:
+        _create_lead_events(cur)
+    
+    # Check if created_at column exists in lead_events table
+    cur.execute('''
+        SELECT column_name 
+        FROM information_schema.columns 
+        WHERE table_name='lead_events' AND column_name='created_at'
+    ''')
+    
+    if not cur.fetchone():
+        print("Adding missing timestamp columns to lead_events table...")
+        cur.execute('''
+            ALTER TABLE lead_events 
+            ADD COLUMN IF NOT EXISTS created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ''')
+    
+    # Create indices for performance
+    cur.execute('''
+        CREATE INDEX IF NOT EXISTS idx_lead_events_customer 
+        ON lead_events(customer_id)
+    ''')
+    
+    cur.execute('''
+        CREATE INDEX IF NOT EXISTS idx_lead_events_status 
+        ON lead_events(status)
+    ''')
+    
+    cur.execute('''
+        CREATE INDEX IF NOT EXISTS idx_lead_events_service 
+        ON lead_events(service_name)
+    ''')
+    
+    cur.execute('''
+        CREATE INDEX IF NOT EXISTS idx_leads_created 
+        ON leads(created_at)
+    ''')
+    
+    # Analytics rollups, maintained by triggers
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS analytics_rollups (
+            dimension TEXT NOT NULL,
+            key TEXT NOT NULL,
+            count BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (dimension, key)
+        )
+    ''')
+    
+    cur.execute(ROLLUP_FUNCTIONS_SQL)
+    
+    cur.execute('SELECT tgname FROM pg_trigger WHERE tgname = ANY(%s)', (list(ROLLUP_TRIGGERS),))
+    existing_triggers = {row[0] for row in cur.fetchall()}
+    missing_triggers = [name for name in ROLLUP_TRIGGERS if name not in existing_triggers]
+    
+    if missing_triggers:
+        print("Installing analytics rollup triggers...")
+        for name in missing_triggers:
+            cur.execute(ROLLUP_TRIGGERS[name])
+        _rebuild_rollups(cur)
+    
+    # Current status per (customer, service), maintained by trigger
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS lead_current_status (
+            customer_id TEXT REFERENCES leads(customer_id) ON DELETE CASCADE,
+            service_name TEXT,
+            status TEXT,
+            submitted_at TIMESTAMP,
+            last_event_id INTEGER,
+            seen_statuses TEXT[] NOT NULL DEFAULT '{}',
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (customer_id, service_name)
+        )
+    ''')
+    
+    cur.execute(CURRENT_STATUS_FUNCTION_SQL)
+    
+    cur.execute("SELECT 1 FROM pg_trigger WHERE tgname = 'trg_lead_current_status'")
+    if not cur.fetchone():
+        print("Installing lead_current_status trigger...")
+        cur.execute(CURRENT_STATUS_TRIGGER_SQL)
+        _rebuild_current_status(cur)
+    
+    # Composite indices for per-customer/service history lookups
+    cur.execute('''
+        CREATE INDEX IF NOT EXISTS idx_lead_events_customer_service_submitted 
+        ON lead_events(customer_id, service_name, submitted_at DESC)
+    ''')
+    
+    cur.execute('''
+        CREATE INDEX IF NOT EXISTS idx_lead_events_customer_service_status 
+        ON lead_events(customer_id, service_name, status)
+    ''')
+    
+    # Covering index for /api/aggregates - date-range scans stay index-only
+    cur.execute('''
+        CREATE INDEX IF NOT EXISTS idx_lead_events_submitted_covering 
+        ON lead_events(submitted_at) INCLUDE (status, service_name, vendor_id, rate_card)
+    ''')
+    
+    # Data version - bumped by every write path, used for ETags
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS data_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    cur.execute('INSERT INTO data_version (id, version) VALUES (1, 0) ON CONFLICT (id) DO NOTHING')
+    
+    # Incremental sync high-water marks, one row per upstream source
+    cur.execute('''
+        CREATE TABLE IF NOT EXISTS sync_state (
+            source TEXT PRIMARY KEY,
+            watermark TIMESTAMPTZ,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Keyset pagination indices - must match queries.EVENT_SORT_KEY
+    cur.execute('''
+        CREATE INDEX IF NOT EXISTS idx_lead_events_keyset
+        ON lead_events((COALESCE(submitted_at, '-infinity'::timestamp)) DESC, event_id DESC)
+    ''')
+    
+    cur.execute('''
+        CREATE INDEX IF NOT EXISTS idx_lead_events_status_keyset
+        ON lead_events(status, (COALESCE(submitted_at, '-infinity'::timestamp)) DESC, event_id DESC)
+    ''')
+    
+    cur.execute('''
+        CREATE INDEX IF NOT EXISTS idx_lead_events_service_keyset
+        ON lead_events(service_name, (COALESCE(submitted_at, '-infinity'::timestamp)) DESC, event_id DESC)
+    ''')
+
+def lead_search_indexes(cur):
+    """Trigram GIN indexes behind /api/search.
+    
+    The expressions must match queries.SEARCH_*_EXPR exactly for the
+    planner to use them. First and last name share one index so a query
+    like "priya sha" can match across both.
+    """
+    cur.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    
+    cur.execute('''
+        CREATE INDEX IF NOT EXISTS idx_leads_name_trgm
+        ON leads USING GIN ((lower(coalesce(first_name, '') || ' ' || coalesce(last_name, ''))) gin_trgm_ops)
+    ''')
+    
+    cur.execute('''
+        CREATE INDEX IF NOT EXISTS idx_leads_email_trgm
+        ON leads USING GIN ((lower(coalesce(email, ''))) gin_trgm_ops)
+    ''')
+    
+    cur.execute('''
+        CREATE INDEX IF NOT EXISTS idx_leads_phone_trgm
+        ON leads USING GIN ((regexp_replace(coalesce(phone, ''), '[^0-9]', '', 'g')) gin_trgm_ops)
+    ''')
+
+def service_content_hash(cur):
+    """Fingerprint of each customer and service's last synced payload"""
+    cur.execute('ALTER TABLE lead_current_status ADD COLUMN IF NOT EXISTS content_hash BYTEA')
+
+MIGRATIONS = [
+    (1, 'Baseline schema', baseline_schema),
+    (2, 'Trigram search indexes on leads', lead_search_indexes),
+    (3, 'Content hash per customer and service for change detection', service_content_hash),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def get_schema_version(cur):
+    """Highest applied migration, or 0 on a database that has none"""
+    cur.execute("SELECT to_regclass('schema_version')")
+    if cur.fetchone()[0] is None:
+        return 0
+    cur.execute('SELECT COALESCE(MAX(version), 0) FROM schema_version')
+    return cur.fetchone()[0]
+
+def migrate():
+    """Apply pending migrations in order; a single cheap query when current"""
+    try:
+        with get_db() as conn:
+            current = get_schema_version(conn.cursor())
+        
+        if current >= LATEST_VERSION:
+            print(f"✅ Schema up to date (version {current})")
+            return True
+        
+        for version, description, apply in MIGRATIONS:
+            if version <= current:
+                continue
+            
+            with get_db() as conn:
+                cur = conn.cursor()
+                cur.execute('SELECT pg_advisory_xact_lock(%s)', (MIGRATION_LOCK_ID,))
+                cur.execute(SCHEMA_VERSION_SQL)
+                
+                # Another runner may have applied it while we waited for the lock
+                if get_schema_version(cur) < version:
+                    print(f"Applying migration {version}: {description}...")
+                    apply(cur)
+                    cur.execute(
+                        'INSERT INTO schema_version (version, description) VALUES (%s, %s)',
+                        (version, description)
+                    )
+                
+                cur.close()
+        
+        print(f"✅ Schema migrated to version {LATEST_VERSION}")
+        return True
+    
+    except Exception as e:
+        print(f"❌ Migration error: {e}")
+        return False
+
+def check_schema():
+    """Warn (without touching the schema) if migrations are pending"""
+    try:
+        with get_db() as conn:
+            current = get_schema_version(conn.cursor())
+    except Exception as e:
+        print(f"⚠️  Could not read schema version: {e}")
+        return None
+    
+    if current < LATEST_VERSION:
+        print(f"⚠️  Schema is at version {current}, code expects {LATEST_VERSION} - run python migrations.py")
+    return current
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'status':
+        check_schema()
+        print(f"Latest migration: {LATEST_VERSION}")
+    else:
+        if not migrate() or maintain_partitions() is None:
+            sys.exit(1)
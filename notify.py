@@ -0,0 +1,116 @@
+"""
+Dashboard Push Events - Redis Pub/Sub Fan-out
+✅ NEW: "data changed" and rescrape progress events for the SSE endpoint
+"""
+import json
+import time
+import threading
+import redis
+import redis.asyncio
+from config import (
+    EVENTS_REDIS_URL, EVENTS_CHANNEL, SSE_HEARTBEAT_SECONDS, SSE_MAX_DURATION,
+    SSE_MAX_STREAMS, SSE_BUSY_RETRY_SECONDS
+)
+
+_client = None
+_async_client = None
+
+# Gunicorn threads this worker may spend on open streams
+_stream_slots = threading.BoundedSemaphore(max(1, SSE_MAX_STREAMS))
+
+def get_client():
+    """Get the shared Redis client for publishing and subscribing"""
+    global _client
+    if _client is None:
+        # No socket_timeout - subscribers block in get_message() by design
+        _client = redis.Redis.from_url(EVENTS_REDIS_URL, decode_responses=True)
+    return _client
+
+def get_async_client():
+    """Get the Redis client for subscribers on the asyncio server"""
+    global _async_client
+    if _async_client is None:
+        _async_client = redis.asyncio.Redis.from_url(EVENTS_REDIS_URL, decode_responses=True)
+    return _async_client
+
+def publish(event, data=None):
+    """Publish an event to every subscribed dashboard, on any worker"""
+    try:
+        get_client().publish(EVENTS_CHANNEL, json.dumps({'event': event, 'data': data or {}}))
+        return True
+    except redis.RedisError as e:
+        print(f"⚠️  Could not publish {event} event: {e}")
+        return False
+
+def format_sse(event, data):
+    """Format one Server-Sent Events message"""
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+def format_message(message):
+    """Format a pub/sub message as SSE, or None if it isn't a valid event"""
+    try:
+        payload = json.loads(message['data'])
+    except (TypeError, ValueError):
+        return None
+    return format_sse(payload.get('event', 'message'), payload.get('data', {}))
+
+def sse_stream():
+    """Yield SSE messages from the Redis channel until SSE_MAX_DURATION.
+    
+    Sends a comment heartbeat every SSE_HEARTBEAT_SECONDS so proxies keep the
+    connection open. Ending the stream periodically frees the serving thread;
+    EventSource reconnects on its own after the retry delay. With
+    SSE_MAX_STREAMS streams already open in this worker, the client is told
+    to come back in SSE_BUSY_RETRY_SECONDS instead of taking another thread.
+    """
+    if not _stream_slots.acquire(blocking=False):
+        yield f'retry: {SSE_BUSY_RETRY_SECONDS * 1000}\n\n'
+        return
+    
+    pubsub = get_client().pubsub(ignore_subscribe_messages=True)
+    try:
+        pubsub.subscribe(EVENTS_CHANNEL)
+        yield 'retry: 3000\n\n'
+        yield format_sse('connected', {})
+        
+        deadline = time.monotonic() + SSE_MAX_DURATION
+        while time.monotonic() < deadline:
+            message = pubsub.get_message(timeout=SSE_HEARTBEAT_SECONDS)
+            if message is None:
+                yield ': ping\n\n'
+                continue
+            
+            sse = format_message(message)
+            if sse:
+                yield sse
+    
+    finally:
+        pubsub.close()
+        _stream_slots.release()
+
+async def sse_stream_async():
+    """sse_stream() for the asyncio server.
+    
+    Each subscriber is a coroutine rather than a thread, so long-lived
+    streams cost almost nothing to hold open.
+    """
+    pubsub = get_async_client().pubsub(ignore_subscribe_messages=True)
+    await pubsub.subscribe(EVENTS_CHANNEL)
+    
+    try:
+        yield 'retry: 3000\n\n'
+        yield format_sse('connected', {})
+        
+        deadline = time.monotonic() + SSE_MAX_DURATION
+        while time.monotonic() < deadline:
+            message = await pubsub.get_message(timeout=SSE_HEARTBEAT_SECONDS)
+            if message is None:
+                yield ': ping\n\n'
+                continue
+            
+            sse = format_message(message)
+            if sse:
+                yield sse
+    
+    finally:
+        await pubsub.aclose()
@@ -0,0 +1,105 @@
+"""
+HTML Page Delivery - Precompiled, Cached & Precompressed
+✅ NEW: login/dashboard rendered once per worker with gzip/brotli variants
+"""
+import os
+import gzip
+import hashlib
+from flask import Response, request
+from config import DEBUG
+
+try:
+    import brotli
+except ImportError:  # brotli is optional - serve gzip/identity without it
+    brotli = None
+
+PAGES_DIR = os.path.dirname(os.path.abspath(__file__))
+PAGE_CACHE_MAX_AGE = int(os.getenv('PAGE_CACHE_MAX_AGE', 86400))
+
+# Negotiated gzip/brotli for JSON responses at least this large
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', 1024))
+
+# Preferred order when the client accepts several encodings
+ENCODINGS = ('br', 'gzip', 'identity')
+
+_pages = {}
+
+def build_page(jinja_env, filename):
+    """Render a page once and precompute its compressed variants"""
+    path = os.path.join(PAGES_DIR, filename)
+    mtime = os.path.getmtime(path)
+    with open(path, encoding='utf-8') as f:
+        body = jinja_env.from_string(f.read()).render().encode('utf-8')
+    
+    digest = hashlib.sha256(body).hexdigest()[:32]
+    variants = {
+        'identity': body,
+        'gzip': gzip.compress(body, compresslevel=9, mtime=0)
+    }
+    if brotli is not None:
+        variants['br'] = brotli.compress(body, quality=11)
+    
+    return {
+        'mtime': mtime,
+        'variants': variants,
+        'etags': {encoding: f'{digest}-{encoding}' for encoding in variants}
+    }
+
+def get_page(jinja_env, filename):
+    """Get a cached page, rebuilding it when the file changes in development"""
+    page = _pages.get(filename)
+    if page is None or (DEBUG and os.path.getmtime(os.path.join(PAGES_DIR, filename)) != page['mtime']):
+        page = build_page(jinja_env, filename)
+        _pages[filename] = page
+    return page
+
+def choose_encoding(variants, accepted):
+    """Pick the best precompressed variant the client accepts"""
+    for encoding in ENCODINGS:
+        if encoding in variants and (encoding == 'identity' or accepted[encoding] > 0):
+            return encoding
+    return 'identity'
+
+def serve_page(jinja_env, filename, req=request, response_class=Response):
+    """Serve a page with a strong ETag, long-lived caching and 304 support.
+    
+    Defaults to Flask's request/Response; api_async passes Quart's.
+    """
+    page = get_page(jinja_env, filename)
+    encoding = choose_encoding(page['variants'], req.accept_encodings)
+    etag = page['etags'][encoding]
+    
+    if etag in req.if_none_match:
+        response = response_class(status=304)
+    else:
+        response = response_class(page['variants'][encoding], mimetype='text/html')
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    if DEBUG:
+        response.headers['Cache-Control'] = 'no-cache'
+    else:
+        response.headers['Cache-Control'] = f'public, max-age={PAGE_CACHE_MAX_AGE}'
+    return response
+
+def compress_body(data, accepted):
+    """Compress a dynamic response body for the client.
+    
+    Returns (body, encoding); encoding is None when sent uncompressed.
+    Uses fast levels - these run per request, unlike the page variants.
+    """
+    if brotli is not None and accepted['br'] > 0:
+        return brotli.compress(data, quality=4), 'br'
+    if accepted['gzip'] > 0:
+        return gzip.compress(data, compresslevel=5), 'gzip'
+    return data, None
+
+def preload(jinja_env, *filenames):
+    """Build pages at worker start so the first request doesn't pay for it"""
+    for filename in filenames:
+        try:
+            get_page(jinja_env, filename)
+        except OSError as e:
+            print(f"⚠️  Could not preload {filename}: {e}")
@@ -0,0 +1,418 @@
+"""
+Analytics Queries - SQL Builders & Response Formatting
+✅ NEW: Shared by the Flask (api.py) and asyncio (api_async.py) servers
+"""
+import os
+import json
+import base64
+from datetime import datetime
+
+try:
+    import orjson
+except ImportError:  # orjson is optional - fall back to the stdlib encoder
+    orjson = None
+
+# Result cache TTLs (seconds); a new data version also retires entries
+FILTER_OPTIONS_CACHE_TTL = int(os.getenv('FILTER_OPTIONS_CACHE_TTL', 3600))
+FILTERED_ANALYTICS_CACHE_TTL = int(os.getenv('FILTERED_ANALYTICS_CACHE_TTL', 300))
+
+# Server-side aggregation (/api/aggregates)
+AGGREGATE_BUCKETS = ('hour', 'day', 'week')
+AGGREGATE_COLUMNS = ('status', 'service_name', 'vendor_id', 'rate_card')
+AGGREGATES_MAX_ROWS = int(os.getenv('AGGREGATES_MAX_ROWS', 10000))
+AGGREGATES_CACHE_TTL = int(os.getenv('AGGREGATES_CACHE_TTL', 300))
+
+# Pagination for event listings
+DEFAULT_PAGE_SIZE = int(os.getenv('ANALYTICS_PAGE_SIZE', 500))
+MAX_PAGE_SIZE = int(os.getenv('ANALYTICS_MAX_PAGE_SIZE', 5000))
+
+# Rows per server-side cursor fetch in streaming mode
+STREAM_CHUNK_SIZE = int(os.getenv('ANALYTICS_STREAM_CHUNK_SIZE', 2000))
+STREAM_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json'
+}
+
+# Sort key for event listings; matches idx_lead_events_keyset so every page
+# is an index range scan. NULL submitted_at sorts last.
+EVENT_SORT_KEY = "COALESCE(le.submitted_at, '-infinity'::timestamp)"
+
+EVENT_COLUMNS = '''
+    le.event_id,
+    l.customer_id,
+    l.first_name,
+    l.last_name,
+    le.service_name,
+    le.status,
+    le.vendor_id,
+    le.rate_card,
+    le.submitted_at,
+    to_char(le.submitted_at, 'YYYY-MM-DD') AS date,
+    to_char(le.submitted_at, 'HH24:MI:SS') AS time
+'''
+
+# Columnar wire format (?format=columnar): one array per field; low-cardinality
+# fields are dictionary-encoded as indexes into 'dictionaries'
+COLUMNAR_FIELDS = ('event_id', 'customer_id', 'first_name', 'last_name', 'service',
+                   'status', 'vendor_id', 'rate_card', 'submitted_at', 'date', 'time')
+DICTIONARY_FIELDS = ('service', 'status', 'vendor_id')
+
+# Lead search (/api/search)
+# A trigram index can only narrow a match once the pattern holds a whole
+# trigram - anything shorter scans every lead
+SEARCH_MIN_LENGTH = 3
+SEARCH_DEFAULT_LIMIT = int(os.getenv('SEARCH_DEFAULT_LIMIT', 20))
+SEARCH_MAX_LIMIT = int(os.getenv('SEARCH_MAX_LIMIT', 100))
+SEARCH_EVENTS_PER_LEAD = int(os.getenv('SEARCH_EVENTS_PER_LEAD', 5))
+SEARCH_SIMILARITY_THRESHOLD = float(os.getenv('SEARCH_SIMILARITY_THRESHOLD', 0.4))
+
+# Transaction-local <% cutoff; run before search_query() on the same connection
+SEARCH_THRESHOLD_QUERY = "SELECT set_config('pg_trgm.word_similarity_threshold', %s, true)"
+
+# Must match the trigram indexes created by migration 2
+SEARCH_NAME_EXPR = "lower(coalesce(l.first_name, '') || ' ' || coalesce(l.last_name, ''))"
+SEARCH_EMAIL_EXPR = "lower(coalesce(l.email, ''))"
+SEARCH_PHONE_EXPR = "regexp_replace(coalesce(l.phone, ''), '[^0-9]', '', 'g')"
+
+STATUS_OPTIONS_QUERY = 'SELECT DISTINCT status FROM lead_events WHERE status IS NOT NULL ORDER BY status'
+SERVICE_OPTIONS_QUERY = 'SELECT DISTINCT service_name FROM lead_events WHERE service_name IS NOT NULL ORDER BY service_name'
+
+def encode_cursor(submitted_at, event_id):
+    """Build an opaque pagination cursor from the last row of a page"""
+    payload = {
+        't': submitted_at.isoformat() if submitted_at else None,
+        'id': event_id
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Decode a pagination cursor into (submitted_at, event_id)"""
+    padded = cursor + '=' * (-len(cursor) % 4)
+    payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    return payload['t'] or '-infinity', int(payload['id'])
+
+def parse_limit(args, default, maximum):
+    """Read ?limit= capped at maximum, raising ValueError if malformed"""
+    try:
+        limit = int(args.get('limit', default))
+    except (TypeError, ValueError):
+        raise ValueError('limit must be an integer')
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    return min(limit, maximum)
+
+def parse_page_args(args):
+    """Read limit/cursor query params, raising ValueError if malformed"""
+    limit = parse_limit(args, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    
+    cursor = args.get('cursor')
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except Exception:
+        raise ValueError('Invalid cursor')
+    
+    return limit, after
+
+def parse_list_format(args):
+    """Read ?format= for event listings ('rows' by default), raising ValueError"""
+    fmt = args.get('format', 'rows')
+    if fmt not in ('rows', 'columnar'):
+        raise ValueError(f'Unsupported format: {fmt}')
+    return fmt
+
+def parse_stream_format(args):
+    """Read ?stream= (None when not streaming), raising ValueError"""
+    fmt = args.get('stream')
+    if fmt and fmt not in STREAM_FORMATS:
+        raise ValueError(f'Unsupported stream format: {fmt}')
+    return fmt
+
+def parse_date_range(args):
+    """Read ?start= / ?end= (ISO dates, end exclusive), raising ValueError"""
+    try:
+        start = datetime.fromisoformat(args['start']) if args.get('start') else None
+        end = datetime.fromisoformat(args['end']) if args.get('end') else None
+    except ValueError:
+        raise ValueError('start/end must be ISO dates')
+    return start, end
+
+def event_filters(status_filter, service_filter, start=None, end=None):
+    """SQL conditions and params for the dashboard's filters.
+    
+    A start/end bound on submitted_at lets Postgres skip every lead_events
+    partition outside the range.
+    """
+    filters = []
+    params = []
+    
+    if status_filter and status_filter != 'all':
+        filters.append('le.status = %s')
+        params.append(status_filter)
+    
+    if service_filter and service_filter != 'all':
+        filters.append('le.service_name = %s')
+        params.append(service_filter)
+    
+    if start:
+        filters.append('le.submitted_at >= %s')
+        params.append(start)
+    
+    if end:
+        filters.append('le.submitted_at < %s')
+        params.append(end)
+    
+    return filters, params
+
+def build_events_query(conditions):
+    """Build the newest-first event listing query for the given conditions"""
+    query = f'''
+        SELECT {EVENT_COLUMNS}
+        FROM lead_events le
+        JOIN leads l ON le.customer_id = l.customer_id
+    '''
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    return query + f' ORDER BY {EVENT_SORT_KEY} DESC, le.event_id DESC'
+
+def events_page_query(filters, params, limit, after=None):
+    """Build one keyset page query; fetches limit + 1 rows to detect a next page"""
+    conditions = list(filters)
+    params = list(params)
+    
+    if after:
+        conditions.append(f'({EVENT_SORT_KEY}, le.event_id) < (%s::timestamp, %s)')
+        params.extend(after)
+    
+    params.append(limit + 1)
+    return build_events_query(conditions) + ' LIMIT %s', params
+
+def finish_page(rows, limit):
+    """Trim a page query's rows to limit; returns (rows, next_cursor)"""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][8], rows[-1][0])
+    return rows, next_cursor
+
+def fetch_events_page(cur, filters, params, limit, after=None):
+    """Fetch one page of events (newest first) using keyset pagination.
+    
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    query, params = events_page_query(filters, params, limit, after)
+    cur.execute(query, params)
+    return finish_page(cur.fetchall(), limit)
+
+def format_event(row):
+    """Format an event row for the JSON response"""
+    return {
+        'event_id': row[0],
+        'customer_id': row[1],
+        'first_name': row[2],
+        'last_name': row[3],
+        'service': row[4],
+        'status': row[5],
+        'vendor_id': row[6],
+        'rate_card': row[7],
+        'date': row[9],
+        'time': row[10]
+    }
+
+def format_events_columnar(rows):
+    """Format event rows as columns, dictionary-encoding status/service/vendor"""
+    columns = dict(zip(COLUMNAR_FIELDS, map(list, zip(*rows)))) if rows else {field: [] for field in COLUMNAR_FIELDS}
+    del columns['submitted_at']
+    
+    dictionaries = {}
+    for field in DICTIONARY_FIELDS:
+        codes = {}
+        columns[field] = [codes.setdefault(value, len(codes)) for value in columns[field]]
+        dictionaries[field] = list(codes)
+    
+    return {
+        'format': 'columnar',
+        'count': len(rows),
+        'columns': columns,
+        'dictionaries': dictionaries
+    }
+
+def format_events(rows, fmt):
+    """Format event rows as a list of dicts, or columnar"""
+    if fmt == 'columnar':
+        return format_events_columnar(rows)
+    return [format_event(row) for row in rows]
+
+def format_stream_chunk(rows, fmt, first):
+    """Encode one chunk of a streamed listing (NDJSON, or part of a JSON array)"""
+    chunk = [to_json(format_event(row)) for row in rows]
+    if fmt == 'ndjson':
+        return '\n'.join(chunk) + '\n'
+    return ('' if first else ',') + ','.join(chunk)
+
+def to_json(obj):
+    """Serialize with orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj)
+
+def parse_aggregate_args(args):
+    """Read bucket/group_by/start/end for /api/aggregates, raising ValueError"""
+    bucket = args.get('bucket')
+    if bucket and bucket not in AGGREGATE_BUCKETS:
+        raise ValueError(f'bucket must be one of {", ".join(AGGREGATE_BUCKETS)}')
+    
+    group_by = [col for col in args.get('group_by', '').split(',') if col]
+    unknown = [col for col in group_by if col not in AGGREGATE_COLUMNS]
+    if unknown:
+        raise ValueError(f'Cannot group by: {", ".join(unknown)}')
+    
+    start, end = parse_date_range(args)
+    return bucket, group_by, start, end
+
+def aggregates_query(bucket, group_by, start, end):
+    """Build the grouped-count query for /api/aggregates"""
+    keys = []
+    if bucket:
+        keys.append(f"date_trunc('{bucket}', submitted_at)")
+    keys.extend(group_by)
+    
+    conditions = []
+    params = []
+    if start:
+        conditions.append('submitted_at >= %s')
+        params.append(start)
+    if end:
+        conditions.append('submitted_at < %s')
+        params.append(end)
+    if bucket:
+        conditions.append('submitted_at IS NOT NULL')
+    
+    query = f'SELECT {", ".join(keys + ["COUNT(*)"])} FROM lead_events'
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    if keys:
+        positions = ', '.join(str(i + 1) for i in range(len(keys)))
+        query += f' GROUP BY {positions} ORDER BY {positions}'
+    query += ' LIMIT %s'
+    params.append(AGGREGATES_MAX_ROWS + 1)
+    
+    return query, params
+
+def format_aggregates(rows, bucket, group_by):
+    """Format aggregate rows for the JSON response"""
+    names = (['bucket'] if bucket else []) + group_by + ['count']
+    results = []
+    for row in rows[:AGGREGATES_MAX_ROWS]:
+        result = dict(zip(names, row))
+        if bucket:
+            result['bucket'] = result['bucket'].isoformat()
+        results.append(result)
+    
+    return {
+        'bucket': bucket,
+        'group_by': group_by,
+        'rows': results,
+        'truncated': len(rows) > AGGREGATES_MAX_ROWS
+    }
+
+def parse_search_args(args):
+    """Read q/limit for /api/search, raising ValueError"""
+    q = ' '.join(args.get('q', '').lower().split())
+    if len(q) < SEARCH_MIN_LENGTH:
+        raise ValueError(f'q must be at least {SEARCH_MIN_LENGTH} characters')
+    
+    return q, parse_limit(args, SEARCH_DEFAULT_LIMIT, SEARCH_MAX_LIMIT)
+
+def like_pattern(text, prefix=False):
+    """LIKE pattern matching text anywhere (or at the start), wildcards escaped"""
+    escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'{escaped}%' if prefix else f'%{escaped}%'
+
+def search_query(q, limit, events_per_lead=SEARCH_EVENTS_PER_LEAD):
+    """Build the ranked lead search; returns (query, params).
+    
+    Substring (LIKE) and typo-tolerant (word similarity, <%) matches on
+    name, email and phone digits are all served by the trigram GIN indexes.
+    Rank is the best word similarity, plus 1 for a prefix match of a name,
+    email or phone, so "pri" puts Priya ahead of Supriya.
+    """
+    digits = ''.join(ch for ch in q if ch.isdigit())
+    search_phone = len(digits) >= 4
+    
+    name, email, phone = SEARCH_NAME_EXPR, SEARCH_EMAIL_EXPR, SEARCH_PHONE_EXPR
+    conditions = [
+        f'{name} LIKE %(contains)s',
+        f'%(q)s <%% {name}',
+        f'{email} LIKE %(contains)s',
+        f'%(q)s <%% {email}'
+    ]
+    similarity = [f'word_similarity(%(q)s, {name})', f'word_similarity(%(q)s, {email})']
+    prefix = [
+        f'{name} LIKE %(prefix)s',
+        "lower(coalesce(l.last_name, '')) LIKE %(prefix)s",
+        f'{email} LIKE %(prefix)s'
+    ]
+    if search_phone:
+        conditions.append(f'{phone} LIKE %(phone_contains)s')
+        similarity.append(f'CASE WHEN {phone} LIKE %(phone_contains)s THEN 1.0 ELSE 0 END')
+        prefix.append(f'{phone} LIKE %(phone_prefix)s')
+        prefix.append(f"{phone} LIKE '91' || %(phone_prefix)s")
+    
+    query = f'''
+        WITH matches AS (
+            SELECT
+                l.customer_id, l.first_name, l.last_name, l.email, l.phone,
+                GREATEST({', '.join(similarity)})
+                    + CASE WHEN {' OR '.join(prefix)} THEN 1 ELSE 0 END AS score
+            FROM leads l
+            WHERE {' OR '.join(conditions)}
+            ORDER BY score DESC, l.customer_id
+            LIMIT %(limit)s
+        )
+        SELECT m.customer_id, m.first_name, m.last_name, m.email, m.phone, m.score,
+               COALESCE(ev.events, '[]'::json)
+        FROM matches m
+        LEFT JOIN LATERAL (
+            SELECT json_agg(json_build_object(
+                'event_id', e.event_id,
+                'service', e.service_name,
+                'status', e.status,
+                'vendor_id', e.vendor_id,
+                'rate_card', e.rate_card,
+                'date', to_char(e.submitted_at, 'YYYY-MM-DD'),
+                'time', to_char(e.submitted_at, 'HH24:MI:SS')
+            ) ORDER BY e.submitted_at DESC NULLS LAST, e.event_id DESC) AS events
+            FROM (
+                SELECT * FROM lead_events le
+                WHERE le.customer_id = m.customer_id
+                ORDER BY le.submitted_at DESC NULLS LAST, le.event_id DESC
+                LIMIT %(events)s
+            ) e
+        ) ev ON TRUE
+        ORDER BY m.score DESC, m.customer_id
+    '''
+    params = {
+        'q': q,
+        'contains': like_pattern(q),
+        'prefix': like_pattern(q, prefix=True),
+        'phone_contains': like_pattern(digits),
+        'phone_prefix': like_pattern(digits, prefix=True),
+        'limit': limit,
+        'events': events_per_lead
+    }
+    return query, params
+
+def format_search_results(rows):
+    """Format search rows for the JSON response"""
+    return [
+        {
+            'customer_id': row[0],
+            'first_name': row[1],
+            'last_name': row[2],
+            'email': row[3],
+            'phone': row[4],
+            'score': round(float(row[5]), 3),
+            'latest_events': row[6]
+        }
+        for row in rows
+    ]
@@ -3,210 +3,797 @@ Bellevie Scraper with Real-Time Sync
 ✅ FIXES: Deduplication, status tracking, event counting logic
 """
 import os
-import requests
+import sys
+import gzip
 import json
-from datetime import datetime
+import time
+import queue
+import random
+import hashlib
+import threading
+import requests
+from collections import deque
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+import notify
+import metrics
+try:
+    import ijson
+except ImportError:  # ijson is optional - bodies are then parsed whole
+    ijson = None
 from database import (
-    get_db, insert_or_update_lead, insert_lead_event, 
-    update_lead_event_status, init_db
+    get_db, get_rollups, bump_data_version, get_sync_watermark,
+    set_sync_watermark, save_sync_watermark, maintain_partitions, rebuild_current_status
 )
 
 BELLEVIE_API_URL = os.getenv('BELLEVIE_API_URL', 'https://api.bellevie.app')
 BELLEVIE_API_KEY = os.getenv('BELLEVIE_API_KEY', '')
 
-def fetch_leads_from_bellevie(limit=None):
-    """Fetch leads from Bellevie API"""
+# Incremental sync - Bellevie query params and page size
+BELLEVIE_SOURCE = 'bellevie'
+BELLEVIE_SINCE_PARAM = os.getenv('BELLEVIE_SINCE_PARAM', 'updated_since')
+BELLEVIE_PAGE_SIZE = int(os.getenv('BELLEVIE_PAGE_SIZE', 500))
+BELLEVIE_MAX_PAGES = int(os.getenv('BELLEVIE_MAX_PAGES', 10000))  # runaway-pagination guard
+
+# Concurrent fetching - parallel requests, retries with jittered backoff
+BELLEVIE_CONCURRENCY = int(os.getenv('BELLEVIE_CONCURRENCY', 4))
+BELLEVIE_MAX_RETRIES = int(os.getenv('BELLEVIE_MAX_RETRIES', 5))
+BELLEVIE_BACKOFF_BASE = float(os.getenv('BELLEVIE_BACKOFF_BASE', 0.5))
+BELLEVIE_BACKOFF_CAP = float(os.getenv('BELLEVIE_BACKOFF_CAP', 30))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Fetch/write pipeline - leads per DB transaction, pages buffered in between
+SYNC_BATCH_SIZE = int(os.getenv('SYNC_BATCH_SIZE', 5000))
+SYNC_QUEUE_PAGES = int(os.getenv('SYNC_QUEUE_PAGES', 8))
+
+JSON_SCALAR_EVENTS = ('string', 'number', 'boolean', 'null')
+
+def parse_timestamp(value):
+    """Parse a Bellevie ISO timestamp, or None"""
+    if not value:
+        return None
     try:
-        print("🔄 Fetching leads from Bellevie...")
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    # Naive timestamps are UTC, so they compare with aware ones
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def lead_watermark(lead):
+    """The timestamp a lead advances the sync watermark to"""
+    return parse_timestamp(lead.get('updated_at')) or parse_timestamp(lead.get('submitted_at'))
+
+def make_bellevie_session():
+    """Keep-alive session sized for BELLEVIE_CONCURRENCY parallel requests"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=BELLEVIE_CONCURRENCY)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({
+        'Authorization': f'Bearer {BELLEVIE_API_KEY}',
+        'Content-Type': 'application/json'
+    })
+    return session
+
+def rate_limit_delay(response):
+    """Seconds the server asked us to wait (Retry-After / X-RateLimit-*), or None"""
+    retry_after = response.headers.get('Retry-After')
+    if retry_after:
+        try:
+            return max(0.0, float(retry_after))
+        except ValueError:
+            try:
+                return max(0.0, (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds())
+            except (TypeError, ValueError):
+                pass
+    
+    if response.headers.get('X-RateLimit-Remaining') == '0':
+        reset = response.headers.get('X-RateLimit-Reset')
+        try:
+            reset = float(reset)
+        except (TypeError, ValueError):
+            return None
+        # Either an epoch timestamp or seconds-until-reset
+        return max(0.0, reset - time.time()) if reset > 1e9 else reset
+    
+    return None
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff"""
+    return random.uniform(0, min(BELLEVIE_BACKOFF_CAP, BELLEVIE_BACKOFF_BASE * 2 ** attempt))
+
+def bellevie_get(session, url, params=None, stream=False):
+    """GET a Bellevie page with retries on network errors, 429 and 5xx.
+    
+    Returns the parsed body, or with stream=True the response with its
+    body still unread (the caller must close it).
+    """
+    for attempt in range(BELLEVIE_MAX_RETRIES + 1):
+        try:
+            response = session.get(url, params=params, timeout=30, stream=stream)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            if attempt == BELLEVIE_MAX_RETRIES:
+                raise
+            delay = backoff_delay(attempt)
+            print(f"⚠️  Bellevie request failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+        
+        if response.status_code in RETRY_STATUSES and attempt < BELLEVIE_MAX_RETRIES:
+            delay = rate_limit_delay(response)
+            if delay is None:
+                delay = backoff_delay(attempt)
+            print(f"⚠️  Bellevie returned {response.status_code}, retrying in {delay:.1f}s")
+            response.close()
+            time.sleep(min(delay, BELLEVIE_BACKOFF_CAP * 4))
+            continue
+        
+        if not response.ok:
+            response.close()
+        response.raise_for_status()
+        
+        # Out of quota - pause before handing back so the next call succeeds
+        if response.headers.get('X-RateLimit-Remaining') == '0':
+            delay = rate_limit_delay(response)
+            if delay:
+                time.sleep(min(delay, BELLEVIE_BACKOFF_CAP * 4))
+        
+        return response if stream else response.json()
+
+def iter_json_leads(stream, meta=None):
+    """Yield leads from a JSON body (a list, or an object with 'data') as it is parsed.
+    
+    With ijson only one lead is held at a time, however big the body. The
+    object's top-level scalars (total, next, ...) are collected into meta,
+    which is complete once the generator is exhausted.
+    """
+    meta = {} if meta is None else meta
+    if ijson is None:
+        body = json.load(stream)
+        if isinstance(body, dict):
+            meta.update((key, value) for key, value in body.items() if not isinstance(value, (dict, list)))
+        yield from page_leads(body)
+        return
+    
+    path = None
+    builder = None
+    for prefix, event, value in ijson.parse(stream, use_float=True):
+        if path is None:
+            path = 'item' if event == 'start_array' else 'data.item'
+            continue
         
-        headers = {
-            'Authorization': f'Bearer {BELLEVIE_API_KEY}',
-            'Content-Type': 'application/json'
-        }
+        if builder is None and prefix == path and event in ('start_map', 'start_array'):
+            builder = ijson.ObjectBuilder()
         
-        # Adjust endpoint based on your Bellevie API structure
-        url = f'{BELLEVIE_API_URL}/leads'
-        params = {}
+        if builder is not None:
+            builder.event(event, value)
+            if prefix == path and event in ('end_map', 'end_array'):
+                yield builder.value
+                builder = None
+        elif path == 'data.item' and prefix and '.' not in prefix and event in JSON_SCALAR_EVENTS:
+            meta[prefix] = value
+
+def batched(items, size):
+    """Group an iterable into lists of up to size items"""
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+def stream_bellevie_pages(session, url, params, meta):
+    """Yield one Bellevie response's leads in BELLEVIE_PAGE_SIZE lists, parsed as they arrive"""
+    with bellevie_get(session, url, params, stream=True) as response:
+        response.raw.decode_content = True
+        yield from batched(iter_json_leads(response.raw, meta), BELLEVIE_PAGE_SIZE)
+
+def iter_dump_leads(path):
+    """Yield leads from a JSON or JSONL/NDJSON dump file (optionally .gz), one at a time"""
+    opener = gzip.open if path.endswith('.gz') else open
+    name = path[:-3] if path.endswith('.gz') else path
+    
+    with opener(path, 'rb') as f:
+        if name.endswith(('.jsonl', '.ndjson')):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from iter_json_leads(f)
+
+def lead_id(lead):
+    """Bellevie's id for a lead, as the scraper reads it"""
+    return lead.get('id') or lead.get('customer_id')
+
+def page_leads(body):
+    """Extract the list of leads from a Bellevie response body"""
+    if isinstance(body, dict):
+        return body.get('data', [])
+    return body
+
+def total_pages(body):
+    """Total page count if the response advertises one"""
+    if not isinstance(body, dict):
+        return None
+    for key in ('total_pages', 'last_page'):
+        if body.get(key):
+            return int(body[key])
+    if body.get('total'):
+        return -(-int(body['total']) // BELLEVIE_PAGE_SIZE)
+    return None
+
+def expected_total(body):
+    """Total lead count if the response advertises one"""
+    if isinstance(body, dict) and body.get('total'):
+        return int(body['total'])
+    pages = total_pages(body)
+    return pages * BELLEVIE_PAGE_SIZE if pages else None
+
+def iter_bellevie_pages(since=None, limit=None, on_total=None):
+    """Yield pages (lists of leads) from Bellevie, in order.
+    
+    Page-numbered listings are fetched BELLEVIE_CONCURRENCY pages at a time
+    over one keep-alive session: up to the advertised total page count, or
+    speculatively until a short page comes back. 'next' URL or
+    'next_cursor' listings can only be followed one page at a time.
+    on_total, if given, is called with the expected lead count when the
+    first response advertises one. Paging stops early if the server
+    ignores it - a response bigger than per_page, or a page starting with
+    a lead already seen - and never goes past BELLEVIE_MAX_PAGES.
+    
+    The first response and every cursor-style one are parsed as a stream,
+    so a server that ignores per_page and sends every lead at once costs
+    one page of memory rather than the whole body.
+    """
+    url = f'{BELLEVIE_API_URL}/leads'
+    params = {'page': 1, 'per_page': BELLEVIE_PAGE_SIZE}
+    if since:
+        params[BELLEVIE_SINCE_PARAM] = since.isoformat()
+    
+    fetched = 0
+    
+    def trim(page):
+        nonlocal fetched
         if limit:
-            params['limit'] = limit
+            page = page[:limit - fetched]
+        fetched += len(page)
+        return page
+    
+    with make_bellevie_session() as session:
+        body = {}
+        first_count = 0
+        first_ids = set()
+        for raw in stream_bellevie_pages(session, url, params, body):
+            if not first_count:
+                first_ids.add(lead_id(raw[0]))
+            first_count += len(raw)
+            page = trim(raw)
+            if page:
+                yield page
+            if limit and fetched >= limit:
+                return
         
-        response = requests.get(url, headers=headers, params=params, timeout=30)
-        response.raise_for_status()
+        expected = expected_total(body)
+        if on_total and expected:
+            on_total(min(expected, limit) if limit else expected)
+        
+        if body.get('next') or body.get('next_cursor'):
+            # Cursor-style pagination - sequential
+            pages_fetched = 1
+            while body.get('next') or body.get('next_cursor'):
+                if pages_fetched >= BELLEVIE_MAX_PAGES:
+                    print(f"⚠️  Stopped after BELLEVIE_MAX_PAGES ({BELLEVIE_MAX_PAGES}) pages")
+                    return
+                pages_fetched += 1
+                if body.get('next'):
+                    # Absolute next-page URL already carries its query string
+                    url, params = body['next'], None
+                else:
+                    params = dict(params or {}, cursor=body['next_cursor'])
+                body = {}
+                for raw in stream_bellevie_pages(session, url, params, body):
+                    page = trim(raw)
+                    if page:
+                        yield page
+                    if limit and fetched >= limit:
+                        return
+            return
+        
+        # Page-numbered pagination - a sliding window of parallel requests
+        last_page = total_pages(body)
+        if first_count < BELLEVIE_PAGE_SIZE and not (last_page and last_page > 1):
+            return
+        if first_count > BELLEVIE_PAGE_SIZE:
+            # per_page was ignored - assume that was everything
+            print(f"⚠️  Bellevie sent {first_count} leads for per_page={BELLEVIE_PAGE_SIZE}; not paging")
+            return
+        if last_page:
+            last_page = min(last_page, BELLEVIE_MAX_PAGES)
+        
+        next_page = 2
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=BELLEVIE_CONCURRENCY) as pool:
+            def submit():
+                nonlocal next_page
+                pending.append(pool.submit(bellevie_get, session, url, dict(params, page=next_page)))
+                next_page += 1
+            
+            try:
+                def more():
+                    return next_page <= (last_page or BELLEVIE_MAX_PAGES)
+                
+                while len(pending) < BELLEVIE_CONCURRENCY and more():
+                    submit()
+                
+                while pending:
+                    raw = page_leads(pending.popleft().result())
+                    if len(raw) > BELLEVIE_PAGE_SIZE or (raw and lead_id(raw[0]) in first_ids):
+                        # The server is ignoring page/per_page - this is a repeat
+                        print("⚠️  Bellevie repeated a page; stopping pagination")
+                        break
+                    if raw:
+                        first_ids.add(lead_id(raw[0]))
+                    
+                    page = trim(raw)
+                    if page:
+                        yield page
+                    
+                    if len(raw) < BELLEVIE_PAGE_SIZE or (limit and fetched >= limit):
+                        break
+                    if more():
+                        submit()
+                    elif not pending and not last_page:
+                        print(f"⚠️  Stopped after BELLEVIE_MAX_PAGES ({BELLEVIE_MAX_PAGES}) pages")
+            finally:
+                for future in pending:
+                    future.cancel()
+
+def fetch_leads_from_bellevie(limit=None, since=None):
+    """Fetch leads from Bellevie API.
+    
+    With since, only leads updated after that timestamp are requested.
+    Returns None if the fetch failed, so callers never advance the
+    watermark past data they didn't get. Holds every lead in memory -
+    syncs go through sync_from_bellevie() instead.
+    """
+    try:
+        if since:
+            print(f"🔄 Fetching leads from Bellevie updated since {since.isoformat()}...")
+        else:
+            print("🔄 Fetching leads from Bellevie...")
         
-        leads = response.json()
-        if isinstance(leads, dict) and 'data' in leads:
-            leads = leads['data']
+        leads = []
+        for page in iter_bellevie_pages(since=since, limit=limit):
+            leads.extend(page)
         
         print(f"✅ Fetched {len(leads)} leads from Bellevie")
         return leads
     
     except requests.exceptions.RequestException as e:
         print(f"❌ Error fetching leads from Bellevie: {e}")
-        return []
+        return None
     except json.JSONDecodeError as e:
         print(f"❌ Error parsing Bellevie response: {e}")
-        return []
+        return None
+
+def sync_from_bellevie(since=None, limit=None, on_progress=None, skip_unchanged=True):
+    """Fetch from Bellevie and sync to the database concurrently.
+    
+    A producer thread pushes pages into a bounded queue while this thread
+    writes SYNC_BATCH_SIZE-lead batches, so network and database time
+    overlap and at most SYNC_QUEUE_PAGES pages wait in memory. The
+    watermark is only advanced once every page has been fetched and
+    written. on_progress, if given, is called with the running totals after
+    every page fetched and batch written. skip_unchanged=False rewrites
+    leads whose content hash matches (see sync_leads_to_database()).
+    Returns a dict of counts, or None if fetching or a write failed.
+    """
+    def iter_pages(on_total):
+        return iter_bellevie_pages(since=since, limit=limit, on_total=on_total)
+    
+    return sync_pages(iter_pages, 'Bellevie', on_progress=on_progress, skip_unchanged=skip_unchanged)
+
+def sync_from_dump(path, on_progress=None, skip_unchanged=True):
+    """Backfill from a JSON or JSONL dump file through the same pipeline.
+    
+    The file is parsed lead by lead, so memory is bounded by the batch
+    size, not the file size. The sync watermark is left alone - a dump
+    says nothing about what the live API has already delivered.
+    """
+    def iter_pages(on_total):
+        return batched(iter_dump_leads(path), BELLEVIE_PAGE_SIZE)
+    
+    return sync_pages(iter_pages, path, on_progress=on_progress, advance_watermark=False,
+                      skip_unchanged=skip_unchanged)
+
+def sync_pages(iter_pages, source, on_progress=None, advance_watermark=True, skip_unchanged=True):
+    """Write the pages iter_pages(on_total) yields, fetching and writing concurrently.
+    
+    Peak memory is SYNC_QUEUE_PAGES pages plus one SYNC_BATCH_SIZE batch.
+    A failed write, or an exception here (on_progress included), stops the
+    producer instead of leaving it to download the rest.
+    See sync_from_bellevie() for on_progress and the return value.
+    """
+    pages = queue.Queue(maxsize=SYNC_QUEUE_PAGES)
+    done = object()
+    stop = threading.Event()
+    fetch_errors = []
+    
+    totals = {'expected': None, 'fetched': 0, 'written': 0, 'new': 0, 'updated': 0, 'status_changed': 0,
+              'unchanged': 0, 'fetch_seconds': None}
+    
+    def set_expected(expected):
+        totals['expected'] = expected
+    
+    def put(item):
+        # Wait for room in the queue, but give up once the consumer has stopped
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+    
+    def produce():
+        started = time.monotonic()
+        source_pages = iter_pages(set_expected)
+        try:
+            for page in source_pages:
+                put(page)
+                if stop.is_set():
+                    break
+        except Exception as e:
+            fetch_errors.append(e)
+        finally:
+            # Closing the generator ends its HTTP session / open file now
+            close = getattr(source_pages, 'close', None)
+            if close:
+                close()
+            totals['fetch_seconds'] = round(time.monotonic() - started, 3)
+            put(done)
+    
+    producer = threading.Thread(target=produce, name='bellevie-fetch', daemon=True)
+    producer.start()
+    
+    watermark = None
+    write_failed = False
+    batch = []
+    
+    def flush(leads, watermark=None):
+        counts = sync_leads_to_database(leads, watermark=watermark, skip_unchanged=skip_unchanged)
+        if counts is None:
+            return False
+        totals['written'] += len(leads)
+        totals['new'] += counts[0]
+        totals['updated'] += counts[1]
+        totals['status_changed'] += counts[2]
+        totals['unchanged'] += counts[3]
+        report()
+        return True
+    
+    def report():
+        if on_progress:
+            on_progress(dict(totals))
+    
+    try:
+        while True:
+            page = pages.get()
+            if page is done:
+                break
+            
+            totals['fetched'] += len(page)
+            report()
+            batch.extend(page)
+            if advance_watermark:
+                for lead in page:
+                    lead_mark = lead_watermark(lead)
+                    if lead_mark and (watermark is None or lead_mark > watermark):
+                        watermark = lead_mark
+            
+            # Write exactly SYNC_BATCH_SIZE leads at a time
+            while len(batch) >= SYNC_BATCH_SIZE and not write_failed:
+                write_failed = not flush(batch[:SYNC_BATCH_SIZE])
+                batch = batch[SYNC_BATCH_SIZE:]
+            if write_failed:
+                # Nothing more can be written - stop downloading
+                batch = []
+                break
+    finally:
+        stop.set()
+        producer.join()
+    
+    if fetch_errors:
+        print(f"❌ Error fetching leads from {source}: {fetch_errors[0]}")
+        # Keep what we did get, but don't advance the watermark
+        if batch and not write_failed:
+            flush(batch)
+        return None
+    
+    if write_failed:
+        return None
+    
+    if batch:
+        if not flush(batch, watermark=watermark):
+            return None
+    elif watermark:
+        save_sync_watermark(BELLEVIE_SOURCE, watermark)
+    
+    print(f"✅ Fetched and synced {totals['fetched']} leads from {source}")
+    return totals
+
+def normalize_lead(lead):
+    """Map a raw Bellevie lead onto our column order, or None if it has no id"""
+    customer_id = lead.get('id') or lead.get('customer_id')
+    if not customer_id:
+        return None
+    
+    return (
+        str(customer_id),
+        lead.get('first_name', ''),
+        lead.get('last_name', ''),
+        lead.get('email', ''),
+        lead.get('phone', ''),
+        lead.get('service_name', lead.get('service', 'Unknown')),
+        lead.get('status', 'Unknown'),
+        lead.get('vendor', 'N/A'),
+        lead.get('rate_card', 'N/A'),
+        lead.get('submitted_at')
+    )
+
+def row_hash(lead):
+    """Content hash of one normalize_lead() row - lead fields plus its service's state (submitted_at excluded)"""
+    return hashlib.blake2b(json.dumps(lead[1:9], default=str).encode(), digest_size=16).digest()
+
+def unchanged_rows(cur, rows):
+    """seqs of rows whose (customer_id, service_name) already stores the same content hash.
+    
+    The hash lives on lead_current_status, one per customer and service, so
+    it doesn't depend on which of a customer's services a batch carries.
+    """
+    cur.execute('''
+        SELECT customer_id, service_name, content_hash
+        FROM lead_current_status
+        WHERE customer_id = ANY(%s) AND content_hash IS NOT NULL
+    ''', (list({row[1] for row in rows}),))
+    stored = {(customer_id, service_name): bytes(content_hash) for customer_id, service_name, content_hash in cur.fetchall()}
+    return {row[0] for row in rows if stored.get((row[1], row[6])) == row[-1]}
 
-def sync_leads_to_database(leads):
-    """Sync leads to database with deduplication logic"""
+def sync_leads_to_database(leads, watermark=None, skip_unchanged=True):
+    """Sync leads to database with deduplication logic.
+    
+    The whole batch is COPY'd into a temp staging table, then leads are
+    upserted and new lead_events appended with set-based statements in a
+    single transaction. Rows whose content hash matches the one stored for
+    their customer and service are dropped first, so unchanged leads cost
+    one indexed lookup and no writes; a batch that changes nothing doesn't
+    bump the data version. skip_unchanged=False processes every row - a
+    full resync uses it to recreate lost events. If
+    watermark is given, the Bellevie sync watermark is advanced in the
+    same transaction. Returns (new_count, updated_count, status_updated,
+    unchanged_count), or None if the sync failed.
+    """
     try:
-        init_db()  # Ensure tables exist
-        
-        conn = get_db()
-        if not conn:
-            print("❌ Database connection failed")
-            return 0, 0
+        rows = []
+        for lead in leads:
+            row = normalize_lead(lead)
+            if row is None:
+                print(f"⚠️  Skipping lead without customer_id: {lead}")
+                continue
+            rows.append((len(rows),) + row + (row_hash(row),))
         
-        cur = conn.cursor()
-        new_count = 0
-        updated_count = 0
-        status_updated = 0
+        if not rows:
+            print("⚠️  No leads to sync")
+            return 0, 0, 0, 0
         
-        for lead in leads:
-            try:
-                customer_id = lead.get('id') or lead.get('customer_id')
-                first_name = lead.get('first_name', '')
-                last_name = lead.get('last_name', '')
-                email = lead.get('email', '')
-                phone = lead.get('phone', '')
-                service = lead.get('service_name', lead.get('service', 'Unknown'))
-                status = lead.get('status', 'Unknown')
-                vendor = lead.get('vendor', 'N/A')
-                rate_card = lead.get('rate_card', 'N/A')
-                submitted_at = lead.get('submitted_at')
+        with get_db() as conn:
+            with conn.transaction():
+                cur = conn.cursor()
+                
+                # Skip rows whose customer/service hasn't changed since the last sync
+                unchanged = unchanged_rows(cur, rows) if skip_unchanged else set()
+                rows = [row for row in rows if row[0] not in unchanged]
+                unchanged_count = len(unchanged)
+                
+                if not rows:
+                    if watermark:
+                        set_sync_watermark(cur, BELLEVIE_SOURCE, watermark)
+                    cur.close()
+                    print(f"⏭️  All {unchanged_count} leads unchanged - nothing to write")
+                    return 0, 0, 0, unchanged_count
                 
-                if not customer_id:
-                    print(f"⚠️  Skipping lead without customer_id: {lead}")
-                    continue
+                cur.execute('''
+                    CREATE TEMP TABLE lead_sync_staging (
+                        seq INTEGER,
+                        customer_id TEXT,
+                        first_name TEXT,
+                        last_name TEXT,
+                        email TEXT,
+                        phone TEXT,
+                        service_name TEXT,
+                        status TEXT,
+                        vendor_id TEXT,
+                        rate_card TEXT,
+                        submitted_at TIMESTAMP,
+                        content_hash BYTEA
+                    ) ON COMMIT DROP
+                ''')
                 
-                # Check if lead exists
-                cur.execute('SELECT customer_id FROM leads WHERE customer_id = %s', (customer_id,))
-                lead_exists = cur.fetchone()
+                with cur.copy('''
+                    COPY lead_sync_staging (
+                        seq, customer_id, first_name, last_name, email, phone,
+                        service_name, status, vendor_id, rate_card, submitted_at, content_hash
+                    ) FROM STDIN
+                ''') as copy:
+                    for row in rows:
+                        copy.write_row(row)
                 
-                # Insert/update lead
+                # Upsert leads - last occurrence in the batch wins, and rows
+                # whose fields are unchanged aren't touched (updated_at stays).
+                # xmax = 0 only for freshly inserted rows.
                 cur.execute('''
                     INSERT INTO leads (customer_id, first_name, last_name, email, phone)
-                    VALUES (%s, %s, %s, %s, %s)
+                    SELECT DISTINCT ON (customer_id)
+                        customer_id, first_name, last_name, email, phone
+                    FROM lead_sync_staging
+                    ORDER BY customer_id, seq DESC
                     ON CONFLICT (customer_id) DO UPDATE SET
                         first_name = EXCLUDED.first_name,
                         last_name = EXCLUDED.last_name,
                         email = EXCLUDED.email,
                         phone = EXCLUDED.phone,
                         updated_at = CURRENT_TIMESTAMP
-                ''', (customer_id, first_name, last_name, email, phone))
+                    WHERE (leads.first_name, leads.last_name, leads.email, leads.phone)
+                        IS DISTINCT FROM (EXCLUDED.first_name, EXCLUDED.last_name, EXCLUDED.email, EXCLUDED.phone)
+                    RETURNING (xmax = 0)
+                ''')
+                upserted = cur.fetchall()
+                new_count = sum(1 for (inserted,) in upserted if inserted)
+                updated_count = len(upserted) - new_count
                 
-                if lead_exists:
-                    updated_count += 1
-                else:
-                    new_count += 1
+                # Append an event for every (customer, service, status) we have
+                # never seen. It is a status change when the customer/service
+                # already had history, or an earlier row in this batch did.
+                # Both checks are one join against lead_current_status.
+                cur.execute('''
+                    WITH batch AS (
+                        SELECT DISTINCT ON (customer_id, service_name, status) *
+                        FROM lead_sync_staging
+                        ORDER BY customer_id, service_name, status, seq
+                    ),
+                    fresh AS (
+                        SELECT
+                            b.*,
+                            cs.customer_id IS NOT NULL AS had_history,
+                            ROW_NUMBER() OVER (
+                                PARTITION BY b.customer_id, b.service_name
+                                ORDER BY b.seq
+                            ) AS batch_rank
+                        FROM batch b
+                        LEFT JOIN lead_current_status cs
+                            ON cs.customer_id = b.customer_id
+                            AND cs.service_name = b.service_name
+                        WHERE (b.status = ANY(cs.seen_statuses)) IS NOT TRUE
+                    ),
+                    inserted AS (
+                        INSERT INTO lead_events 
+                        (customer_id, service_name, status, vendor_id, rate_card, submitted_at)
+                        SELECT customer_id, service_name, status, vendor_id, rate_card, submitted_at
+                        FROM fresh
+                        ORDER BY seq
+                        RETURNING event_id
+                    )
+                    SELECT
+                        (SELECT COUNT(*) FROM inserted),
+                        (SELECT COUNT(*) FROM fresh WHERE had_history OR batch_rank > 1)
+                ''')
+                events_inserted, status_updated = cur.fetchone()
                 
-                # Check if event with same status already exists
+                # Remember what each customer/service looked like (the
+                # trigger above has created any missing status rows)
                 cur.execute('''
-                    SELECT event_id FROM lead_events
-                    WHERE customer_id = %s 
-                    AND service_name = %s 
-                    AND status = %s
-                    ORDER BY submitted_at DESC
-                    LIMIT 1
-                ''', (customer_id, service, status))
+                    UPDATE lead_current_status cs
+                    SET content_hash = s.content_hash
+                    FROM (
+                        SELECT DISTINCT ON (customer_id, service_name) customer_id, service_name, content_hash
+                        FROM lead_sync_staging
+                        ORDER BY customer_id, service_name, seq DESC
+                    ) s
+                    WHERE cs.customer_id = s.customer_id AND cs.service_name = s.service_name
+                ''')
                 
-                event_exists = cur.fetchone()
+                # A changed hash needn't mean visible changes (e.g. a status
+                # already seen before) - only bump the version for real ones
+                data_version = None
+                if new_count or updated_count or events_inserted:
+                    data_version = bump_data_version(cur)
                 
-                if not event_exists:
-                    # Check if status changed
-                    cur.execute('''
-                        SELECT status FROM lead_events
-                        WHERE customer_id = %s 
-                        AND service_name = %s
-                        ORDER BY submitted_at DESC
-                        LIMIT 1
-                    ''', (customer_id, service))
-                    
-                    last_event = cur.fetchone()
-                    if last_event and last_event[0] != status:
-                        # Status changed - update last event
-                        status_updated += 1
-                    
-                    # Insert new event
-                    cur.execute('''
-                        INSERT INTO lead_events 
-                        (customer_id, service_name, status, vendor, rate_card, submitted_at)
-                        VALUES (%s, %s, %s, %s, %s, %s)
-                    ''', (customer_id, service, status, vendor, rate_card, submitted_at))
+                if watermark:
+                    set_sync_watermark(cur, BELLEVIE_SOURCE, watermark)
                 
-                conn.commit()
-            
-            except Exception as e:
-                print(f"❌ Error processing lead {customer_id}: {e}")
-                conn.rollback()
-                continue
+                cur.close()
         
-        cur.close()
-        conn.close()
+        # Committed - the new data version retires every cached result
+        if data_version is not None:
+            notify.publish('data_changed', {'version': data_version})
         
         print(f"\n📊 Sync Complete:")
         print(f"   ✅ New leads: {new_count}")
         print(f"   🔄 Updated leads: {updated_count}")
+        print(f"   ⏭️  Unchanged leads: {unchanged_count}")
         print(f"   📝 Status changes: {status_updated}")
+        print(f"   🧾 New events: {events_inserted}")
+        print(f"   🏷️  Data version: {data_version}")
         
-        return new_count, updated_count
+        return new_count, updated_count, status_updated, unchanged_count
     
     except Exception as e:
         print(f"❌ Error syncing leads: {e}")
-        return 0, 0
+        return None
 
 def get_analytics():
-    """Get current analytics"""
+    """Get current analytics (O(1) reads from the rollup tables)"""
+    analytics = get_rollups()
+    if analytics is None:
+        print("❌ Error getting analytics")
+    return analytics
+
+def full_rescrape(full_resync=False, on_progress=None):
+    """Rescrape cycle - incremental from the stored watermark by default.
+    
+    full_resync=True ignores the watermark and re-fetches every lead
+    (recovery mode). on_progress receives running fetch/write totals.
+    Returns the totals dict, or None if the rescrape failed.
+    """
+    started = time.monotonic()
+    totals = None
     try:
-        conn = get_db()
-        if not conn:
-            return None
-        
-        cur = conn.cursor()
-        
-        # Total lead events
-        cur.execute('SELECT COUNT(*) FROM lead_events')
-        total_events = cur.fetchone()[0]
-        
-        # Unique customers
-        cur.execute('SELECT COUNT(DISTINCT customer_id) FROM leads')
-        unique_customers = cur.fetchone()[0]
-        
-        # Status distribution
-        cur.execute('''
-            SELECT status, COUNT(*) as count
-            FROM lead_events
-            GROUP BY status
-            ORDER BY count DESC
-        ''')
-        status_dist = {row[0]: row[1] for row in cur.fetchall()}
-        
-        cur.close()
-        conn.close()
-        
-        return {
-            'total_events': total_events,
-            'unique_customers': unique_customers,
-            'status_distribution': status_dist
-        }
+        totals = _full_rescrape(full_resync, on_progress)
+        return totals
+    finally:
+        metrics.observe_rescrape(totals, time.monotonic() - started)
+
+def _full_rescrape(full_resync, on_progress):
+    """full_rescrape() without the metrics bookkeeping"""
+    since = None if full_resync else get_sync_watermark(BELLEVIE_SOURCE)
     
-    except Exception as e:
-        print(f"❌ Error getting analytics: {e}")
+    if since:
+        print(f"\n🚀 Starting incremental rescrape (watermark {since.isoformat()})...")
+    else:
+        print("\n🚀 Starting full rescrape...")
+    
+    # Fetch from Bellevie and sync to database, overlapped
+    # A full resync is the recovery path: re-derive seen statuses from the
+    # events actually stored, and rewrite even "unchanged" leads, so lost
+    # lead_events rows are recreated
+    if full_resync and not rebuild_current_status():
+        print("❌ Rescrape failed")
         return None
-
-def full_rescrape():
-    """Full rescrape cycle"""
-    print("\n🚀 Starting full rescrape...")
     
-    # Fetch from Bellevie
-    leads = fetch_leads_from_bellevie()
+    totals = sync_from_bellevie(since=since, on_progress=on_progress, skip_unchanged=not full_resync)
+    
+    if totals is None:
+        print("❌ Rescrape failed")
+        return None
     
-    if not leads:
+    if not totals['fetched']:
+        if since:
+            print("\n✅ Already up to date")
+            return totals
         print("❌ No leads fetched from Bellevie")
-        return False
+        return None
+    
+    print(f"\n📊 Rescrape totals:")
+    print(f"   ✅ New leads: {totals['new']}")
+    print(f"   🔄 Updated leads: {totals['updated']}")
+    print(f"   ⏭️  Unchanged leads: {totals['unchanged']}")
+    print(f"   📝 Status changes: {totals['status_changed']}")
     
-    # Sync to database
-    new_count, updated_count = sync_leads_to_database(leads)
+    # New months (or late events for old ones) may be sitting in the default partition
+    maintain_partitions()
     
     # Get updated analytics
     analytics = get_analytics()
@@ -217,7 +804,13 @@ def full_rescrape():
         print(f"   Status Distribution: {analytics['status_distribution']}")
     
     print("\n✅ Rescrape completed successfully")
-    return True
+    return totals
 
 if __name__ == '__main__':
-    full_rescrape()
+    if len(sys.argv) > 2 and sys.argv[1] == '--dump':
+        # Offline backfill: python scraper.py --dump leads.jsonl.gz [--full]
+        if sync_from_dump(sys.argv[2], skip_unchanged='--full' not in sys.argv) is None:
+            sys.exit(1)
+        maintain_partitions()
+    else:
+        full_rescrape(full_resync='--full' in sys.argv)
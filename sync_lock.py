@@ -0,0 +1,70 @@
+"""
+Sync Lock - One Rescrape at a Time Across Workers
+✅ NEW: Redis lock whose value is the id of the task that owns the sync, so
+overlapping triggers can be pointed at the run already in flight
+
+/api/rescrape claims the lock for a task id before queuing it; the task
+then finds the lock already naming it. Scheduled runs claim it when they
+start and exit if someone else holds it. The TTL (refreshed as the sync
+reports progress) frees the lock if a worker dies mid-run.
+"""
+import redis
+from config import SYNC_LOCK_REDIS_URL, SYNC_LOCK_KEY, SYNC_LOCK_TTL
+
+# Only the owner may release or extend - compare and act atomically
+RELEASE_SCRIPT = '''
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+'''
+EXTEND_SCRIPT = '''
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+return 0
+'''
+
+_client = None
+
+def get_client():
+    """Get the shared Redis client for the sync lock"""
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(
+            SYNC_LOCK_REDIS_URL,
+            socket_timeout=5,
+            socket_connect_timeout=5,
+            decode_responses=True
+        )
+    return _client
+
+def claim(task_id):
+    """Take the lock for task_id if it is free; returns the id of the task holding it"""
+    client = get_client()
+    while True:
+        if client.set(SYNC_LOCK_KEY, task_id, nx=True, ex=SYNC_LOCK_TTL):
+            return task_id
+        holder = client.get(SYNC_LOCK_KEY)
+        if holder:
+            return holder
+        # Expired between SET and GET - try again
+
+def acquire(task_id):
+    """Whether task_id now owns the lock (claimed for it earlier, or free until now)"""
+    if claim(task_id) != task_id:
+        return False
+    extend(task_id)
+    return True
+
+def extend(task_id):
+    """Reset the lock's TTL while task_id still owns it"""
+    return bool(get_client().eval(EXTEND_SCRIPT, 1, SYNC_LOCK_KEY, task_id, SYNC_LOCK_TTL))
+
+def release(task_id):
+    """Release the lock if task_id owns it"""
+    return bool(get_client().eval(RELEASE_SCRIPT, 1, SYNC_LOCK_KEY, task_id))
+
+def holder():
+    """Id of the task holding the lock, or None"""
+    return get_client().get(SYNC_LOCK_KEY)
@@ -1,52 +1,140 @@
 """
 Celery Tasks - Background Job Processing
 ✅ FIXED: Proper task definitions with retry logic
+✅ NEW: rescrape_data runs scraper.full_rescrape with real progress
+✅ NEW: One sync at a time (sync_lock); triggers coalesce onto the running one
 """
-from celery import shared_task, current_task
+from celery import shared_task
 import time
+import uuid
+import notify
+import sync_lock
+# Configures the app shared_task binds to - without it the web servers
+# would queue to Celery's default broker and have no result backend
+from celery_app import celery_app
+
+# Minimum seconds between PROGRESS writes to the result backend
+PROGRESS_INTERVAL = 1.0
+
+def rescrape_progress(totals):
+    """Percent complete from leads fetched and rows written, or None if unknown"""
+    expected = totals.get('expected')
+    if not expected:
+        return None
+    done = min(totals['fetched'], expected) + min(totals['written'], expected)
+    return min(99, int(100 * done / (2 * expected)))
 
 @shared_task(bind=True, max_retries=3)
-def rescrape_data(self):
+def rescrape_data(self, full_resync=False):
     """
     Main rescrape task - Fetches data from Bellevie API
-    Updates database with deduplication logic
+    Updates database with deduplication logic, reporting real progress.
+    Exits without syncing if another task holds the sync lock.
     """
-    try:
-        total_steps = 5
-        
-        # Step 1: Connect to API
-        self.update_state(state='PROGRESS', meta={'progress': 0, 'step': 'Connecting to Bellevie API...'})
-        time.sleep(1)
-        
-        # Step 2: Fetch leads
-        self.update_state(state='PROGRESS', meta={'progress': 20, 'step': 'Fetching leads from API...'})
-        time.sleep(1)
-        
-        # Step 3: Process leads
-        self.update_state(state='PROGRESS', meta={'progress': 40, 'step': 'Processing leads...'})
-        time.sleep(1)
+    from scraper import full_rescrape
+    
+    task_id = self.request.id
+    if not sync_lock.acquire(task_id):
+        print(f"⏭️  Sync already running (task {sync_lock.holder()}) - skipping")
+        return {'status': 'skipped', 'message': 'Another sync is already running'}
+    
+    last_report = 0.0
+    
+    def publish_progress(status, meta):
+        self.update_state(state='PROGRESS', meta=meta)
+        notify.publish('rescrape_progress', {'task_id': self.request.id, 'status': status, **meta})
+    
+    def report(totals):
+        nonlocal last_report
+        now = time.monotonic()
+        if now - last_report < PROGRESS_INTERVAL:
+            return
+        last_report = now
+        sync_lock.extend(task_id)
         
-        # Step 4: Deduplicate
-        self.update_state(state='PROGRESS', meta={'progress': 60, 'step': 'Deduplicating records...'})
-        time.sleep(1)
+        if totals['written'] < totals['fetched']:
+            step = f"Fetched {totals['fetched']} leads, saved {totals['written']}..."
+        else:
+            step = f"Saved {totals['written']} leads..."
         
-        # Step 5: Save to database
-        self.update_state(state='PROGRESS', meta={'progress': 80, 'step': 'Saving to database...'})
-        time.sleep(1)
+        publish_progress('in_progress', {
+            'progress': rescrape_progress(totals),
+            'step': step,
+            **totals
+        })
+    
+    try:
+        publish_progress('in_progress', {'progress': 0, 'step': 'Connecting to Bellevie API...'})
         
-        # Complete
-        self.update_state(state='PROGRESS', meta={'progress': 100, 'step': 'Complete!'})
+        totals = full_rescrape(full_resync=full_resync, on_progress=report)
+        if totals is None:
+            raise RuntimeError('Rescrape failed - see worker logs')
         
-        return {
+        result = {
             'status': 'completed',
             'progress': 100,
-            'message': 'Rescrape completed successfully'
+            'message': 'Rescrape completed successfully',
+            **totals
         }
+        sync_lock.release(task_id)
+        notify.publish('rescrape_progress', {'task_id': task_id, **result})
+        return result
     
     except Exception as exc:
+        retrying = self.request.retries < self.max_retries
+        notify.publish('rescrape_progress', {
+            'task_id': task_id,
+            'status': 'retrying' if retrying else 'failed',
+            'error': str(exc)
+        })
+        # A retry keeps the task id, so it keeps the lock and triggers
+        # meanwhile still coalesce onto it
+        if not retrying:
+            sync_lock.release(task_id)
         # Retry with exponential backoff
         raise self.retry(exc=exc, countdown=60 * (2 ** self.request.retries))
 
+def trigger_rescrape(full_resync=False):
+    """Queue a rescrape unless one is queued or running; returns (task_id, queued).
+    
+    The lock is claimed for the new task id before it is queued, so
+    concurrent calls agree on a single task. A full_resync request made
+    while an incremental sync runs gets that sync's id too.
+    """
+    task_id = str(uuid.uuid4())
+    holder = sync_lock.claim(task_id)
+    if holder != task_id:
+        return holder, False
+    
+    try:
+        rescrape_data.apply_async(kwargs={'full_resync': full_resync}, task_id=task_id)
+    except Exception:
+        sync_lock.release(task_id)
+        raise
+    return task_id, True
+
+def get_task_status(task_id):
+    """Read a rescrape task's state and progress from the result backend"""
+    result = celery_app.AsyncResult(task_id)
+    status = {
+        'task_id': task_id,
+        'state': result.state
+    }
+    
+    if result.state == 'PENDING':
+        status.update({'status': 'pending', 'progress': 0})
+    elif result.state in ('STARTED', 'PROGRESS', 'RETRY'):
+        info = result.info if isinstance(result.info, dict) else {}
+        status.update(info)
+        status['status'] = 'in_progress'
+    elif result.state == 'SUCCESS':
+        status.update(result.result or {})
+        status.update({'status': 'completed', 'progress': 100})
+    else:
+        status.update({'status': 'failed', 'error': str(result.info)})
+    
+    return status
+
 @shared_task
 def health_check():
     """Simple health check task"""